@@ -0,0 +1,70 @@
+import time
+import uuid
+
+from flask import Flask, Response, g, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import flashcards
+import main
+from metrics import REGISTRY, http_request_seconds, trace_id
+from pdf_extract import MAX_PDF_BYTES
+from wallet_management import create_db, start_balance_sync
+
+
+def _start_trace():
+    # Use the caller's trace ID when given (Cloud Run sets X-Cloud-Trace-Context)
+    header = request.headers.get("X-Trace-Id") or request.headers.get(
+        "X-Cloud-Trace-Context", ""
+    ).split("/", 1)[0]
+    trace_id.set(header or uuid.uuid4().hex[:16])
+    g.request_started = time.monotonic()
+
+
+def _finish_trace(response):
+    started = g.get("request_started")
+    if started is not None:
+        http_request_seconds.observe(
+            time.monotonic() - started,
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+    response.headers["X-Trace-Id"] = trace_id.get() or ""
+    return response
+
+
+def metrics_endpoint():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def create_app():
+    """
+    Builds the application serving both the flashcards and the wallets routes,
+    plus /metrics in the Prometheus text format.
+
+    mistralai, PyPDF2 and tonutils are not imported here; each is loaded by
+    the first request that needs it, which keeps cold starts short. Run
+    startup_report.py to measure the import cost.
+
+    Returns:
+        Flask: The configured application.
+    """
+    app = Flask(__name__)
+    # Oversized bodies are refused before they are spooled; a PDF upload plus
+    # its form fields is the largest request served
+    app.config["MAX_CONTENT_LENGTH"] = MAX_PDF_BYTES + 1024 * 1024
+    # Apply ProxyFix middleware to fix 403 Forbidden error when accessed via ngrok
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_host=1)
+
+    app.register_blueprint(flashcards.bp)
+    app.register_blueprint(main.bp)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
+
+    # Every request gets a trace ID for its log lines and is timed
+    app.before_request(_start_trace)
+    app.after_request(_finish_trace)
+
+    # Create the database on startup
+    create_db()
+    start_balance_sync()
+    return app
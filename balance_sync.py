@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+from event_loop import run_sync
+from metrics import log
+
+NANOTONS_PER_TON = 10**9
+
+
+class BalanceSynchronizer:
+    """
+    Periodically refreshes the balances stored in the users table.
+
+    Each cycle picks up to max_wallets wallets, recently active ones first and
+    then those with the oldest balances, reads them from Tonapi in bulk
+    requests of batch_size accounts and writes the results back, so that
+    balance reads are served from the database and never wait on the chain.
+    """
+
+    def __init__(
+        self,
+        repository,
+        client_factory,
+        interval=60,
+        batch_size=100,
+        max_wallets=1000,
+        active_window=3600,
+    ):
+        """
+        Args:
+            repository (UserRepository): Where wallets are read and balances written.
+            client_factory (callable): Returns the Tonapi client to query.
+            interval (float): Seconds between the start of two cycles.
+            batch_size (int): Accounts per bulk Tonapi request.
+            max_wallets (int): Wallets refreshed per cycle.
+            active_window (float): Seconds since its last activity during which
+                a wallet is refreshed first.
+        """
+        self.repository = repository
+        self.client_factory = client_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_wallets = max_wallets
+        self.active_window = active_window
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "cycles": 0,
+            "wallets_updated": 0,
+            "failed_batches": 0,
+            "last_cycle_at": None,
+            "last_cycle_seconds": None,
+        }
+
+    def start(self, delay=0.0):
+        """
+        Starts the background thread, unless it is already running.
+
+        Args:
+            delay (float): Seconds to wait before the first cycle.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(delay,), name="balance-sync", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread after the current cycle.
+        """
+        self._stop.set()
+
+    def sync_once(self):
+        """
+        Runs one refresh cycle.
+
+        Returns:
+            int: The number of balances written.
+        """
+        started = time.time()
+        wallets = self.repository.wallets_for_sync(
+            self.max_wallets, started - self.active_window
+        )
+        batches = [
+            wallets[start : start + self.batch_size]
+            for start in range(0, len(wallets), self.batch_size)
+        ]
+        outcomes = run_sync(self._read_batches(batches)) if batches else []
+
+        updated, failed = 0, 0
+        read_at = time.time()
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                log(f"Balance sync batch failed: {outcome}")
+                failed += 1
+                continue
+            balances = [
+                (wallet_id, outcome[address] / NANOTONS_PER_TON)
+                for wallet_id, address in batch
+                if address in outcome
+            ]
+            self.repository.update_balances(balances, updated_at=read_at)
+            updated += len(balances)
+
+        with self._lock:
+            self._stats["cycles"] += 1
+            self._stats["wallets_updated"] += updated
+            self._stats["failed_batches"] += failed
+            self._stats["last_cycle_at"] = started
+            self._stats["last_cycle_seconds"] = time.time() - started
+        return updated
+
+    async def _read_batches(self, batches):
+        client = self.client_factory()
+        return await asyncio.gather(
+            *(
+                client.get_account_balances([address for _, address in batch])
+                for batch in batches
+            ),
+            return_exceptions=True,
+        )
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cycle count, balances written, failed batches and the time
+                and duration of the last cycle.
+        """
+        with self._lock:
+            return dict(self._stats, running=self._thread is not None and self._thread.is_alive())
+
+    def _run(self, delay):
+        self._stop.wait(delay)
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self.sync_once()
+            except Exception as e:
+                log(f"Balance sync cycle failed: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.time() - started)))
@@ -0,0 +1,181 @@
+"""
+Stand-in for the Mistral chat completions API, for load tests that must not
+spend API credits.
+
+Flashcard prompts get a deck with the requested number of cards, evaluation
+prompts get a verdict for every answered question, and anything else (such as
+a repair prompt) gets an empty deck. Streaming requests are answered with
+server-sent events.
+
+Usage:
+    python -m bench.fake_mistral --port 8765 --latency 0.8 --failure-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_CARDS_RE = re.compile(r"create (\d+) flashcards")
+_ANSWER_RE = re.compile(r"^(\S+)\. ", re.MULTILINE)
+_ANSWERS_MARKER = "The user has provided the following answers:"
+
+
+def build_reply(prompt):
+    """
+    Returns:
+        str: JSON content shaped like a real reply to the prompt.
+    """
+    if _ANSWERS_MARKER in prompt:
+        answers = prompt.split(_ANSWERS_MARKER, 1)[1]
+        return json.dumps(
+            {
+                key: {"score": random.randint(0, 10), "feedback": f"Feedback for {key}."}
+                for key in _ANSWER_RE.findall(answers)
+            }
+        )
+    match = _CARDS_RE.search(prompt)
+    number = int(match.group(1)) if match else 0
+    return json.dumps(
+        {
+            "theory": "Theory generated by the benchmark stand-in. " * 20,
+            "flashcards": [
+                {"front": f"Question {idx} {random.random()}", "back": f"Answer {idx}"}
+                for idx in range(number)
+            ],
+        }
+    )
+
+
+def _usage(prompt, content):
+    # Roughly four characters per token, like text_chunks.estimate_tokens()
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def make_handler(latency, jitter, failure_rate, rate_limit_rate, chunk_size=40):
+    """
+    Args:
+        latency (float): Mean seconds before the reply (first chunk when streaming).
+        jitter (float): Maximum seconds added to or removed from latency.
+        failure_rate (float): Share of requests answered with HTTP 500.
+        rate_limit_rate (float): Share of requests answered with HTTP 429.
+        chunk_size (int): Characters per streamed chunk.
+
+    Returns:
+        type: A BaseHTTPRequestHandler subclass.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+            roll = random.random()
+            if roll < failure_rate:
+                return self._send_json(500, {"message": "Injected failure"})
+            if roll < failure_rate + rate_limit_rate:
+                return self._send_json(429, {"message": "Injected rate limit"})
+
+            prompt = request["messages"][-1]["content"]
+            content = build_reply(prompt)
+            reply = {
+                "id": "bench",
+                "model": request["model"],
+                "created": int(time.time()),
+                "usage": _usage(prompt, content),
+            }
+            if not request.get("stream"):
+                reply["object"] = "chat.completion"
+                reply["choices"] = [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ]
+                return self._send_json(200, reply)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(content), chunk_size):
+                last = start + chunk_size >= len(content)
+                event = {
+                    "id": "bench",
+                    "object": "chat.completion.chunk",
+                    "model": request["model"],
+                    "created": reply["created"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": content[start : start + chunk_size]},
+                            "finish_reason": "stop" if last else None,
+                        }
+                    ],
+                }
+                if last:
+                    event["usage"] = reply["usage"]
+                self._write_chunk(b"data: " + json.dumps(event).encode() + b"\n\n")
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start(port=0, latency=0.5, jitter=0.0, failure_rate=0.0, rate_limit_rate=0.0):
+    """
+    Starts the server on a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; server_address holds its port.
+    """
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port),
+        make_handler(latency, jitter, failure_rate, rate_limit_rate),
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Mistral chat completions server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = start(args.port, args.latency, args.jitter, args.failure_rate, args.rate_limit_rate)
+    print(f"Fake Mistral listening on http://127.0.0.1:{server.server_address[1]}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
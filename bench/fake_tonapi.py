@@ -0,0 +1,197 @@
+"""
+Stand-in for the Tonapi endpoints used by the wallet routes.
+
+Seqno wallets behave like on chain: an external message is accepted only if
+its seqno matches the wallet's current one, and the seqno advances after
+apply_delay seconds, as if the message had landed in a block. Messages from
+preprocessed v2r1 and v3r1 wallets are understood; the seqno get-method
+answers 404 for wallets that never sent anything, like an undeployed account.
+
+Usage:
+    python -m bench.fake_tonapi --port 8766 --latency 0.1 --apply-delay 0.5
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pytoniq_core import Address, Cell, MessageAny, begin_cell
+from tonutils.wallet import PreprocessedWalletV2R1
+
+BALANCE_NANOTONS = 5 * 10**9
+
+
+class ChainState:
+    """
+    Seqnos of the wallets that sent messages, keyed by raw address.
+    """
+
+    def __init__(self, apply_delay):
+        self.apply_delay = apply_delay
+        self._seqnos = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def seqno(self, address):
+        with self._lock:
+            return self._seqnos.get(address, 0)
+
+    def known(self, address):
+        with self._lock:
+            return address in self._seqnos or address in self._pending
+
+    def submit(self, boc):
+        """
+        Accepts a preprocessed v2r1 or v3r1 external message.
+
+        Returns:
+            str: An error message, or None if the message was accepted.
+        """
+        message = MessageAny.deserialize(Cell.one_from_boc(boc).begin_parse())
+        address = message.info.dest.to_str(is_user_friendly=False)
+        body = message.body.begin_parse()
+        body.skip_bits(512)
+        if body.remaining_bits >= 96:
+            # v3r1: wallet_id, valid_until and seqno follow the signature
+            body.skip_bits(64)
+            seqno = body.load_uint(32)
+        else:
+            signed = body.load_ref().begin_parse()
+            signed.skip_bits(64)
+            seqno = signed.load_uint(16)
+
+        with self._lock:
+            if seqno != self._seqnos.get(address, 0):
+                return f"seqno mismatch: got {seqno}, expected {self._seqnos.get(address, 0)}"
+            self._pending.add(address)
+        threading.Timer(self.apply_delay, self._apply, (address, seqno)).start()
+        return None
+
+    def _apply(self, address, seqno):
+        with self._lock:
+            if self._seqnos.get(address, 0) == seqno:
+                self._seqnos[address] = seqno + 1
+
+
+def _raw_account(seqno):
+    data = begin_cell().store_bytes(bytes(32)).store_uint(seqno, 16).end_cell()
+    return {
+        "balance": BALANCE_NANOTONS,
+        "code": PreprocessedWalletV2R1.CODE_HEX,
+        "data": data.to_boc().hex(),
+        "status": "active",
+        "last_transaction_lt": 0,
+        "last_transaction_hash": "",
+    }
+
+
+def make_handler(state, latency, jitter, failure_rate):
+    """
+    Args:
+        state (ChainState): Shared seqno state.
+        latency (float): Mean seconds before each reply.
+        jitter (float): Maximum seconds added to or removed from latency.
+        failure_rate (float): Share of requests answered with HTTP 500.
+
+    Returns:
+        type: A BaseHTTPRequestHandler subclass.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _delay_or_fail(self):
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            if random.random() < failure_rate:
+                self._send_json(500, {"error": "Injected failure"})
+                return True
+            return False
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if self._delay_or_fail():
+                return
+            prefix = "/v2/blockchain/accounts/"
+            if not path.startswith(prefix):
+                return self._send_json(404, {"error": "Not found"})
+            account, _, rest = path[len(prefix) :].partition("/")
+            address = Address(account).to_str(is_user_friendly=False)
+            if rest == "methods/seqno":
+                if not state.known(address):
+                    return self._send_json(404, {"error": "entity not found"})
+                return self._send_json(
+                    200,
+                    {"success": True, "decoded": {"state": state.seqno(address)}},
+                )
+            self._send_json(200, _raw_account(state.seqno(address)))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self._delay_or_fail():
+                return
+            if self.path == "/v2/blockchain/message":
+                error = state.submit(request["boc"])
+                if error:
+                    return self._send_json(400, {"error": error})
+                return self._send_json(200, {})
+            if self.path == "/v2/accounts/_bulk":
+                return self._send_json(
+                    200,
+                    {
+                        "accounts": [
+                            {"address": account, "balance": BALANCE_NANOTONS}
+                            for account in request.get("account_ids", [])
+                        ]
+                    },
+                )
+            self._send_json(404, {"error": "Not found"})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start(port=0, latency=0.1, jitter=0.0, failure_rate=0.0, apply_delay=0.5):
+    """
+    Starts the server on a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; server_address holds its port.
+    """
+    state = ChainState(apply_delay)
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(state, latency, jitter, failure_rate)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Tonapi server.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--apply-delay", type=float, default=0.5)
+    args = parser.parse_args()
+    server = start(args.port, args.latency, args.jitter, args.failure_rate, args.apply_delay)
+    print(f"Fake Tonapi listening on http://127.0.0.1:{server.server_address[1]}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
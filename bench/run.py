@@ -0,0 +1,367 @@
+"""
+Load test for the backend against local stand-ins for Mistral and Tonapi.
+
+Starts the fake servers, launches the app in a subprocess pointed at them
+(through MISTRAL_SERVER_URL and TONAPI_BASE_URL, with throwaway databases),
+drives each scenario at the given concurrency and prints latency percentiles,
+throughput and error rates as JSON.
+
+Usage:
+    python -m bench.run --concurrency 16 --requests 200 \\
+        --scenarios flashcards_json,flashcards_pdf,evaluate,create_wallet,send \\
+        --mistral-latency 0.8 --mistral-failure-rate 0.01 --output report.json
+
+Pass --target to benchmark an app that is already running; it must then be
+configured to use the fake servers, whose ports are fixed with
+--mistral-port and --tonapi-port.
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bench import fake_mistral, fake_tonapi
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["flashcards_json", "flashcards_pdf", "evaluate", "create_wallet", "send"]
+
+
+def make_pdf(pages, label="", lines_per_page=40):
+    """
+    Builds a text-only PDF without any PDF library. The label is written on
+    every line, so documents with different labels extract to different text.
+
+    Returns:
+        bytes: The document.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [
+            f"{label} page {page + 1} line {line}: benchmark text about a topic worth studying."
+            for line in range(lines_per_page)
+        ]
+        text = " T* ".join(f"({line})Tj" for line in lines)
+        stream = f"BT /F1 11 Tf 14 TL 50 760 Td {text} ET".encode()
+        page_number, content_number = len(objects) + 1, len(objects) + 2
+        kids.append(f"{page_number} 0 R")
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+def _multipart(fields, file_field, filename, content):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'
+        ).encode()
+        + content
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def request(base_url, method, path, json_body=None, body=None, content_type=None, timeout=300):
+    """
+    Returns:
+        tuple: (HTTP status or None on a connection error, parsed JSON or None).
+    """
+    if json_body is not None:
+        body, content_type = json.dumps(json_body).encode(), "application/json"
+    req = urllib.request.Request(base_url + path, data=body, method=method)
+    if content_type:
+        req.add_header("Content-Type", content_type)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            status, payload = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, payload = e.code, e.read()
+    except OSError:
+        return None, None
+    try:
+        return status, json.loads(payload)
+    except ValueError:
+        return status, None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    idx = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[idx]
+
+
+def run_scenario(call, requests, concurrency):
+    """
+    Issues call(i) for i in range(requests) from concurrency threads.
+
+    Returns:
+        dict: Latency percentiles in seconds, throughput, error rate and
+            the count of each HTTP status.
+    """
+
+    def timed(idx):
+        started = time.perf_counter()
+        status = call(idx)
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for status, _ in results if status is None or status >= 400)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "throughput_rps": requests / elapsed if elapsed else None,
+        "error_rate": errors / requests if requests else 0.0,
+        "statuses": statuses,
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+
+
+def build_scenarios(base_url, args):
+    """
+    Prepares the fixtures each scenario needs (a deck, sender keys).
+
+    Returns:
+        dict: Maps scenario names to callables taking the request index and
+            returning the HTTP status.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    scenarios = {
+        "flashcards_json": lambda idx: request(
+            base_url,
+            "POST",
+            "/flashcards",
+            {"topic": f"Benchmark topic {run_id} {idx}", "number": args.cards},
+        )[0],
+        "flashcards_pdf": lambda idx: request(
+            base_url,
+            "POST",
+            "/flashcards",
+            *_pdf_body(make_pdf(args.pdf_pages, f"{run_id} {idx}"), args.cards, idx),
+        )[0],
+        "create_wallet": lambda idx: request(
+            base_url, "POST", "/create-wallet", {"wallet_id": f"bench-{run_id}-{idx}"}
+        )[0],
+    }
+
+    if "evaluate" in args.scenarios:
+        status, deck = request(
+            base_url,
+            "POST",
+            "/flashcards",
+            {"topic": f"Benchmark evaluation deck {run_id}", "number": args.cards},
+        )
+        if status != 200:
+            raise RuntimeError(f"Could not create the evaluation deck: HTTP {status}")
+        scenarios["evaluate"] = lambda idx: request(
+            base_url,
+            "POST",
+            "/evaluate_answers",
+            {
+                "deck_id": deck["deck_id"],
+                "answers": {
+                    str(card): f"Answer {run_id} {idx} {card}"
+                    for card in range(1, len(deck["flashcards"]) + 1)
+                },
+            },
+        )[0]
+
+    if "send" in args.scenarios:
+        from tonutils.wallet import WalletV3R1
+
+        # Senders are created through the API so that /send reads their keys
+        # from the keystore
+        senders = [f"bench-sender-{run_id}-{idx}" for idx in range(args.senders)]
+        request(base_url, "POST", "/create-wallets", {"wallet_ids": senders})
+        destination = WalletV3R1.create(None)[0].address.to_str()
+        scenarios["send"] = lambda idx: request(
+            base_url,
+            "POST",
+            "/send",
+            {
+                "wallet_id": senders[idx % len(senders)],
+                "send_to": destination,
+                "amount": 0.01,
+            },
+        )[0]
+    return scenarios
+
+
+def _pdf_body(pdf, cards, idx):
+    body, content_type = _multipart({"number": cards}, "file", f"bench-{idx}.pdf", pdf)
+    return None, body, content_type
+
+
+def start_app(port, env, workdir):
+    """
+    Launches the app factory on the Flask server in a subprocess and waits
+    until it answers. The app runs in workdir, so the files it writes (such
+    as the databases and the keystore key) are thrown away with it.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from app import create_app; "
+            f"create_app().run(host='127.0.0.1', port={port}, threaded=True)",
+        ],
+        cwd=workdir,
+        env=dict(env, PYTHONPATH=REPO_ROOT),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if request(f"http://127.0.0.1:{port}", "GET", "/metrics", timeout=1)[0] == 200:
+            return process
+        if process.poll() is not None:
+            raise RuntimeError("The app exited during startup.")
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("The app did not start within 60 seconds.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test against fake Mistral and Tonapi.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario.")
+    parser.add_argument("--cards", type=int, default=10)
+    parser.add_argument("--pdf-pages", type=int, default=5)
+    parser.add_argument("--senders", type=int, default=4, help="Distinct /send wallets.")
+    parser.add_argument("--mistral-latency", type=float, default=0.5)
+    parser.add_argument("--mistral-jitter", type=float, default=0.1)
+    parser.add_argument("--mistral-failure-rate", type=float, default=0.0)
+    parser.add_argument("--mistral-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--mistral-port", type=int, default=0)
+    parser.add_argument("--tonapi-latency", type=float, default=0.05)
+    parser.add_argument("--tonapi-jitter", type=float, default=0.01)
+    parser.add_argument("--tonapi-failure-rate", type=float, default=0.0)
+    parser.add_argument("--tonapi-apply-delay", type=float, default=0.5)
+    parser.add_argument("--tonapi-port", type=int, default=0)
+    parser.add_argument("--app-port", type=int, default=5099)
+    parser.add_argument("--target", help="Base URL of an already running app.")
+    parser.add_argument("--output", help="Also write the report to this file.")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    mistral = fake_mistral.start(
+        args.mistral_port,
+        args.mistral_latency,
+        args.mistral_jitter,
+        args.mistral_failure_rate,
+        args.mistral_rate_limit_rate,
+    )
+    tonapi = fake_tonapi.start(
+        args.tonapi_port,
+        args.tonapi_latency,
+        args.tonapi_jitter,
+        args.tonapi_failure_rate,
+        args.tonapi_apply_delay,
+    )
+
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            env = dict(
+                os.environ,
+                MISTRAL_SERVER_URL=f"http://127.0.0.1:{mistral.server_address[1]}",
+                TONAPI_BASE_URL=f"http://127.0.0.1:{tonapi.server_address[1]}",
+                USERS_DB_PATH=os.path.join(workdir, "users.sql"),
+                DECK_STORE_PATH=os.path.join(workdir, "decks.sql"),
+                FLASHCARD_CACHE_PATH=os.path.join(workdir, "flashcards_cache.sqlite"),
+                BALANCE_SYNC_INTERVAL="0",
+            )
+            process = start_app(args.app_port, env, workdir)
+            base_url = f"http://127.0.0.1:{args.app_port}"
+
+        try:
+            calls = build_scenarios(base_url, args)
+            report = {
+                "config": {
+                    key: value for key, value in vars(args).items() if key != "output"
+                },
+                "scenarios": {
+                    name: run_scenario(calls[name], args.requests, args.concurrency)
+                    for name in args.scenarios
+                },
+            }
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(10)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class DeckStore:
+    """
+    SQLite-backed repository for generated flashcard decks.
+
+    Decks are addressed by a random deck ID, so lookups are a primary key read
+    no matter how many decks have been generated.
+    """
+
+    def __init__(self, path="decks.sql"):
+        """
+        Args:
+            path (str): The SQLite database file.
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS decks (
+                deck_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+        """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS decks_created_at ON decks (created_at)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, data):
+        """
+        Stores a deck and returns its new ID.
+
+        Args:
+            data (dict): The deck with 'theory' and 'flashcards' fields.
+
+        Returns:
+            str: The deck ID.
+        """
+        deck_id = uuid.uuid4().hex
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO decks (deck_id, created_at, data) VALUES (?, ?, ?)",
+            (deck_id, time.time(), json.dumps(data)),
+        )
+        conn.commit()
+        return deck_id
+
+    def get(self, deck_id):
+        """
+        Args:
+            deck_id (str): The deck ID returned by save().
+
+        Returns:
+            dict: The deck, or None if the ID is unknown.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT data FROM decks WHERE deck_id = ?", (deck_id,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def latest(self):
+        """
+        Returns:
+            dict: The most recently saved deck, or None if the store is empty.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT data FROM decks ORDER BY created_at DESC LIMIT 1")
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,98 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import queue
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    Returns the process-wide event loop, starting it on a daemon thread on first
+    use. Long-lived async clients are bound to this loop so their connection
+    pools survive across requests.
+
+    Returns:
+        asyncio.AbstractEventLoop: The running background loop.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="event-loop", daemon=True
+            )
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+async def _in_context(coro, context):
+    # Carries the caller's context variables, such as the trace ID, over to the
+    # loop thread; the task running this wrapper has its own copy to set them in
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run_sync(coro, timeout=None):
+    """
+    Runs a coroutine on the background loop and blocks until it finishes. The
+    coroutine sees the caller's context variables.
+
+    Args:
+        coro: The coroutine to run.
+        timeout (float): Seconds to wait before giving up, or None to wait forever.
+
+    Returns:
+        The coroutine's result.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        _in_context(coro, contextvars.copy_context()), get_loop()
+    )
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+def iterate_sync(agen):
+    """
+    Consumes an async generator on the background loop and yields its items to
+    a synchronous caller, for example a streaming Flask response.
+
+    Args:
+        agen: The async generator to consume.
+
+    Yields:
+        The generator's items, as soon as each one is produced.
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put((item, None))
+        except Exception as e:
+            items.put((None, e))
+        finally:
+            items.put((done, None))
+
+    future = asyncio.run_coroutine_threadsafe(
+        _in_context(pump(), contextvars.copy_context()), get_loop()
+    )
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        # Stops the upstream generator if the client disconnects early
+        future.cancel()
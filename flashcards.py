@@ -1,43 +1,217 @@
-from flask import Flask, request, jsonify
-from werkzeug.middleware.proxy_fix import ProxyFix
+from flask import Blueprint, Response, request, jsonify, url_for
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
+import asyncio
 import json
-import glob
-from datetime import datetime
-from mistralai import (
-    Mistral,
-)  # Ensure this import is correct based on your Mistral package
-import PyPDF2  # Added import for PDF reading
-
-app = Flask(__name__)
-CORS(app)
-# Apply ProxyFix middleware to fix 403 Forbidden error when accessed via ngrok
-app.wsgi_app = ProxyFix(app.wsgi_app, x_host=1)
+import math
+import re
+import time
+from difflib import SequenceMatcher
+import llm_client
+from deck_store import DeckStore
+from event_loop import iterate_sync, run_sync
+from job_queue import CallbackURLError, JobQueue, QueueFullError
+from llm_scheduler import BULK, INTERACTIVE, DeadlineExceeded
+from metrics import REGISTRY, log, stage
+from json_repair import (
+    get_parse_stats,
+    parse_json,
+    record,
+    validate_evaluation,
+    validate_flashcards,
+)
+from pdf_extract import MAX_PDF_BYTES, extract_pdf_text, get_page_cache
+from pregrade import normalize_answer, pregrade
+from result_cache import ResultCache, make_key, normalize_text
+from review_scheduler import ReviewScheduler
+from singleflight import SingleFlight
+from stream_parser import FlashcardStreamParser
+from text_chunks import estimate_tokens, split_text
+
+# Registered on the application by app.create_app()
+bp = Blueprint("flashcards", __name__)
+CORS(bp)
+
+MODEL = llm_client.MODEL
+# Bump whenever the generation prompt changes so stale cached decks are not served
+PROMPT_VERSION = 1
+
+flashcard_cache = ResultCache(
+    max_entries=int(os.environ.get("FLASHCARD_CACHE_SIZE", 256)),
+    ttl_seconds=float(os.environ.get("FLASHCARD_CACHE_TTL", 24 * 60 * 60)),
+    path=os.environ.get("FLASHCARD_CACHE_PATH", "flashcards_cache.sqlite"),
+    table="flashcards",
+    max_bytes=int(os.environ.get("FLASHCARD_CACHE_MB", 64)) * 1024 * 1024,
+    max_disk_entries=int(os.environ.get("FLASHCARD_CACHE_DISK_SIZE", 20000)),
+)
+
+# Verdicts are keyed on the card and the normalized answer, so a cached score is
+# reused for every student who submits the same answer to the same card
+verdict_cache = ResultCache(
+    max_entries=int(os.environ.get("VERDICT_CACHE_SIZE", 4096)),
+    ttl_seconds=float(os.environ.get("VERDICT_CACHE_TTL", 7 * 24 * 60 * 60)),
+    path=os.environ.get("VERDICT_CACHE_PATH") or None,
+    table="verdicts",
+    max_bytes=int(os.environ.get("VERDICT_CACHE_MB", 16)) * 1024 * 1024,
+    max_disk_entries=int(os.environ.get("VERDICT_CACHE_DISK_SIZE", 200000)),
+)
+
+deck_store = DeckStore(os.environ.get("DECK_STORE_PATH", "decks.sql"))
+
+# Spaced-repetition schedule fed by evaluations that name a user
+review_scheduler = ReviewScheduler(
+    os.environ.get("REVIEW_STORE_PATH", "reviews.sql"),
+    max_users=int(os.environ.get("REVIEW_CACHED_USERS", 10000)),
+)
+# Cards served by one GET /review/next
+REVIEW_MAX_CARDS = 100
+
+# Background generation for POST /flashcards?mode=job
+job_queue = JobQueue(
+    workers=int(os.environ.get("JOB_WORKERS", 4)),
+    max_pending=int(os.environ.get("JOB_MAX_PENDING", 100)),
+)
+
+# Identical generations and evaluation batches in flight share one model call
+generation_flight = SingleFlight("generation")
+evaluation_flight = SingleFlight("evaluation")
+
+# Exported as gauges on /metrics next to the JSON stats endpoints
+REGISTRY.register_stats("flashcard_cache", flashcard_cache.stats)
+REGISTRY.register_stats("verdict_cache", verdict_cache.stats)
+REGISTRY.register_stats("pdf_page_cache", lambda: get_page_cache().stats())
+REGISTRY.register_stats("json_parse", get_parse_stats)
+REGISTRY.register_stats("job_queue", job_queue.stats)
+REGISTRY.register_stats("llm_scheduler", llm_client.scheduler_stats)
+REGISTRY.register_stats("review_scheduler", review_scheduler.stats)
+
+# Long documents are split into sections of this many tokens for map-reduce generation
+CHUNK_TOKENS = int(os.environ.get("FLASHCARD_CHUNK_TOKENS", 6000))
+# Sections generated per deck: one per this many requested cards, at most
+# MAX_SECTIONS; a longer document is sampled evenly instead
+CARDS_PER_SECTION = int(os.environ.get("FLASHCARD_CARDS_PER_SECTION", 3))
+MAX_SECTIONS = int(os.environ.get("FLASHCARD_MAX_SECTIONS", 16))
+# Upper bound on the merged theory of a multi-section deck, in characters
+MAX_THEORY_CHARS = int(os.environ.get("FLASHCARD_MAX_THEORY_CHARS", 8000))
+# Fronts at least this similar are treated as the same card when merging sections
+DUPLICATE_FRONT_RATIO = 0.9
+# Answers are evaluated in concurrent batches of at most this many tokens of
+# cards and answers, and at most this many questions, so large decks neither
+# build one huge prompt nor get truncated JSON back
+EVALUATION_BATCH_TOKENS = int(os.environ.get("EVALUATION_BATCH_TOKENS", 3000))
+EVALUATION_BATCH_QUESTIONS = int(os.environ.get("EVALUATION_BATCH_QUESTIONS", 25))
+
+# Sent with the original output when it cannot be parsed or validated locally
+REPAIR_PROMPT = "INSANELY IMPORTANT: Do not include any markdown or code block formatting in your response and double check that you are outputting a JSON ONLY as it will get parsed into a JSON file: \n"
+
+
+def _cache_key(topic, number):
+    return make_key(normalize_text(topic), number, MODEL, PROMPT_VERSION)
 
 
 def generate_flashcards(topic, number):
-    # Initialize variables
-    data = {}
-    # Retrieve API key from environment variable for security
-    api_key = "wjJKh2KEYQ7ALYbrbbFnDspPpxLxfYsT"
-    if not api_key:
-        print(
-            "Error: API key not found. Please set the MISTRAL_API_KEY environment variable."
-        )
+    return run_sync(generate_flashcards_async(topic, number))
+
+
+async def generate_flashcards_async(topic, number):
+    # Serve repeated topics from the cache instead of calling Mistral again
+    cache_key = _cache_key(topic, number)
+    cached = flashcard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Concurrent requests for the same deck wait for the first one's call
+    async def generate():
+        started = time.monotonic()
+        data = await _generate_flashcards(topic, number)
+        if data:
+            flashcard_cache.set(cache_key, data, cost_seconds=time.monotonic() - started)
         return data
 
-    model = "mistral-large-latest"
+    return await generation_flight.do(cache_key, generate)
+
+
+def _front_words(front):
+    return re.findall(r"\w+|[^\w\s]", normalize_text(front))
+
+
+def _is_duplicate_front(words, seen_fronts):
+    # Compare word sequences so fronts differing in one symbol or number stay distinct
+    for seen in seen_fronts:
+        if words == seen or SequenceMatcher(None, words, seen).ratio() >= DUPLICATE_FRONT_RATIO:
+            return True
+    return False
+
+
+def _shorten(text, limit):
+    if len(text) <= limit:
+        return text
+    cut = text[: limit - 1]
+    # End on a sentence, or at least a word, when one is close enough
+    end = max(cut.rfind(". ") + 1, cut.rfind("\n"))
+    if end < limit // 2:
+        end = cut.rfind(" ")
+    return cut[: end if end > 0 else limit - 1].rstrip() + "…"
+
+
+def merge_flashcard_sections(sections, number):
+    # Interleave cards from all sections so trimming keeps the whole document
+    # covered; every section gets an equal share of the theory budget
+    share = max(1, MAX_THEORY_CHARS // len(sections) - 2)
+    theory = "\n\n".join(_shorten(section["theory"], share) for section in sections)
+    flashcards, seen_fronts = [], []
+    longest = max(len(section["flashcards"]) for section in sections)
+    for idx in range(longest):
+        for section in sections:
+            if idx >= len(section["flashcards"]):
+                continue
+            card = section["flashcards"][idx]
+            words = _front_words(card["front"])
+            if _is_duplicate_front(words, seen_fronts):
+                continue
+            seen_fronts.append(words)
+            flashcards.append(card)
+    return {"theory": theory, "flashcards": flashcards[:number]}
+
+
+def generate_flashcards_chunked(text, number):
+    return run_sync(generate_flashcards_chunked_async(text, number))
+
+
+async def generate_flashcards_chunked_async(text, number):
+    # Map-reduce generation: one request per token-bounded section, run concurrently,
+    # so latency follows the slowest section rather than the document length
+    chunks = split_text(text, CHUNK_TOKENS)
+    if len(chunks) <= 1:
+        return await generate_flashcards_async(text, number)
+
+    # A few cards do not need a model call per section: keep evenly spaced
+    # sections so the deck still spans the document
+    sections_wanted = max(1, min(MAX_SECTIONS, math.ceil(number / CARDS_PER_SECTION)))
+    if len(chunks) > sections_wanted:
+        step = len(chunks) / sections_wanted
+        chunks = [chunks[int((idx + 0.5) * step)] for idx in range(sections_wanted)]
+        if len(chunks) == 1:
+            return await generate_flashcards_async(chunks[0], number)
+
+    # Ask for one spare card per section to make up for duplicates dropped on merge
+    per_chunk = math.ceil(number / len(chunks)) + 1
+    results = await asyncio.gather(
+        *(generate_flashcards_async(chunk, per_chunk) for chunk in chunks)
+    )
 
-    # Initialize the Mistral client
-    try:
-        client = Mistral(api_key=api_key)
-    except Exception as e:
-        print(f"Failed to initialize Mistral client: {e}")
-        return data
+    sections = [result for result in results if result]
+    if not sections:
+        return {}
+    if len(sections) < len(chunks):
+        log(f"Warning: {len(chunks) - len(sections)} of {len(chunks)} sections failed.")
+    return merge_flashcard_sections(sections, number)
 
+
+def build_flashcards_prompt(topic, number):
     # Craft the prompt to request theory information and JSON-formatted flashcards
-    prompt = (
+    return (
         f"You are a flashcard generator. First, provide concise theory information about the topic '{topic}' that would help with understanding the flashcards. "
         f"Then, create {number} flashcards on the topic. "
         "Return the theory information and the flashcards as a JSON object, where the 'theory' field contains "
@@ -47,147 +221,296 @@ def generate_flashcards(topic, number):
         "INSANELY IMPORTANT: Do not include any markdown or code block formatting in your response and double check that you are outputting a JSON ONLY as it will get parsed into a JSON file"
     )
 
+
+async def _generate_flashcards(topic, number):
+    # Initialize variables
+    data = {}
+    prompt = build_flashcards_prompt(topic, number)
+
     # Make the API call
     try:
-        chat_response = client.chat.complete(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
-        )
+        response_content = await llm_client.complete_async(prompt, MODEL, kind="generate")
     except Exception as e:
-        print(f"API call failed: {e}")
+        log(f"API call failed: {e}")
         return data
 
-    # Extract the response content
+    # Parse locally and only fall back to an LLM repair call when that fails
     try:
-        response_content = chat_response.choices[0].message.content.strip()
-    except (AttributeError, IndexError) as e:
-        print(f"Unexpected API response structure: {e}")
-        print("Full response:", chat_response)
-        return data
-    
+        data = await parse_llm_json(response_content, validate_flashcards)
+    except Exception as e:
+        log(f"Error: {e}")
+        log(f"Response content: {response_content}")
 
-        # Make the API call for validation
+    return data
+
+
+async def parse_llm_json(response_content, validate, priority=BULK, deadline=None):
+    """
+    Parses and validates model output, asking the model to re-emit clean JSON
+    only if the local repairs are not enough.
+
+    Args:
+        response_content (str): The raw model output.
+        validate (callable): Schema check that returns the cleaned value or
+            raises ValueError.
+        priority (int): Scheduling priority of the repair call.
+        deadline (float): Deadline of the repair call, usually the one of the
+            call that produced response_content.
+
+    Returns:
+        The validated value.
+
+    Raises:
+        ValueError: If the output is still invalid after the LLM repair.
+    """
+    try:
+        with stage("json_parse"):
+            return validate(parse_json(response_content))
+    except ValueError as e:
+        log(f"Local JSON parse failed, asking the model to repair it: {e}")
+
+    repaired_content = await llm_client.complete_async(
+        REPAIR_PROMPT + response_content,
+        MODEL,
+        kind="repair",
+        priority=priority,
+        deadline=deadline,
+    )
     try:
-        chat_response = client.chat.complete(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": "INSANELY IMPORTANT: Do not include any markdown or code block formatting in your response and double check that you are outputting a JSON ONLY as it will get parsed into a JSON file: \n" + response_content,
-                },
-            ],
+        with stage("json_parse"):
+            value = validate(parse_json(repaired_content))
+    except ValueError:
+        record("failed")
+        raise
+    record("llm_repaired")
+    return value
+
+
+def _deck_events(data):
+    yield {"type": "theory", "theory": data["theory"]}
+    for idx, card in enumerate(data["flashcards"]):
+        yield {"type": "card", "index": idx, "card": card}
+
+
+async def _stream_generation(topic, number, cache_key, flight):
+    # Streams one model call, resolving flight with the validated deck as soon
+    # as it is known
+    started = time.monotonic()
+    parser = FlashcardStreamParser()
+    content = []
+    sent_theory, sent_cards = None, []
+    try:
+        stream = llm_client.stream_async(
+            build_flashcards_prompt(topic, number), MODEL, kind="generate"
         )
+        async for delta in stream:
+            content.append(delta)
+            for kind, value in parser.feed(delta):
+                if kind == "theory" and sent_theory is None:
+                    sent_theory = value
+                    yield {"type": "theory", "theory": value}
+                elif kind == "card":
+                    yield {"type": "card", "index": len(sent_cards), "card": value}
+                    sent_cards.append(value)
     except Exception as e:
-        print(f"API call failed: {e}")
-        return data
+        log(f"API call failed: {e}")
+        yield {"type": "error", "error": "Failed to get response from Mistral API."}
+        return
 
-    # Extract the response content
+    response_content = "".join(content)
     try:
-        validated_response_content = chat_response.choices[0].message.content.strip()
-    except (AttributeError, IndexError) as e:
-        print(f"Unexpected API response structure: {e}")
-        print("Full response:", chat_response)
-        return data
+        data = await parse_llm_json(response_content, validate_flashcards)
+    except Exception as e:
+        log(f"Error: {e}")
+        log(f"Response content: {response_content}")
+        yield {"type": "error", "error": "Failed to generate flashcards."}
+        return
+    flashcard_cache.set(cache_key, data, cost_seconds=time.monotonic() - started)
+    flight.set_result(data)
+
+    if sent_theory not in (None, data["theory"]) or (
+        sent_cards != data["flashcards"][: len(sent_cards)]
+    ):
+        yield {"type": "deck", **data}
+    else:
+        # Send whatever the incremental parser could not, e.g. after an LLM repair
+        for event in _deck_events(data):
+            if event["type"] == "theory" and sent_theory is None:
+                yield event
+            elif event["type"] == "card" and event["index"] >= len(sent_cards):
+                yield event
+
+
+async def stream_flashcards_async(topic, number):
+    """
+    Generates a deck and yields it piece by piece: the theory as soon as it is
+    complete, then every card as soon as its object closes, then a 'done' event
+    with the saved deck ID. If validation of the finished reply drops or
+    reorders what was already streamed, a 'deck' event with the validated theory
+    and cards comes before 'done' and replaces everything sent so far.
+
+    Args:
+        topic (str): The topic or extracted document text.
+        number (int): The number of flashcards to create.
+
+    Yields:
+        dict: Events of type 'theory', 'card', 'deck', 'done' or 'error'.
+    """
+    data = None
+    cache_key = _cache_key(topic, number)
+    if len(split_text(topic, CHUNK_TOKENS)) > 1:
+        # Sections are generated concurrently and can only be emitted once merged
+        data = await generate_flashcards_chunked_async(topic, number)
+    else:
+        data = flashcard_cache.get(cache_key)
+        running = generation_flight.running(cache_key)
+        if data is None and running is not None:
+            # Join a generation of the same deck, streamed or not, instead of
+            # starting another model call
+            data = await asyncio.shield(running)
+
+    if data is None:
+        # Later identical requests wait for this stream's validated deck
+        flight = generation_flight.lead(cache_key)
+        try:
+            async for event in _stream_generation(topic, number, cache_key, flight):
+                yield event
+        finally:
+            # Followers of a failed or abandoned stream see a failed generation
+            if not flight.done():
+                flight.set_result(None)
+        data = flight.result()
+        if not data:
+            return
+    elif not data:
+        yield {"type": "error", "error": "Failed to generate flashcards."}
+        return
+    else:
+        for event in _deck_events(data):
+            yield event
 
-    # Attempt to parse the response as JSON
-    try:
-        flashcard_data = json.loads(validated_response_content)
-
-        if isinstance(flashcard_data, dict):
-            theory = flashcard_data.get("theory")
-            flashcards_list = flashcard_data.get("flashcards")
-            if theory and isinstance(flashcards_list, list):
-                flashcards = []
-                for idx, card in enumerate(flashcards_list, start=1):
-                    front = card.get("front")
-                    back = card.get("back")
-                    if front and back:
-                        flashcards.append({"front": front, "back": back})
-                    else:
-                        print(
-                            f"Warning: Flashcard {idx} is missing 'front' or 'back' field."
-                        )
-                # Store the theory information and the flashcards
-                data = {"theory": theory, "flashcards": flashcards}
-            else:
-                print(
-                    "Error: The response JSON does not contain 'theory' or 'flashcards' properly."
-                )
-        else:
-            print("Error: The response JSON is not a dictionary.")
-    except json.JSONDecodeError:
-        print("Error: Failed to parse the response as JSON.")
-        print("Response content:", response_content)
-        # Optionally, implement alternative parsing here if JSON fails
+    with stage("deck_save"):
+        deck_id = deck_store.save(data)
+    yield {"type": "done", "deck_id": deck_id, "count": len(data["flashcards"])}
 
-    return data
 
+def _request_error(message, status=400):
+    return None, None, (jsonify({"error": message}), status)
 
-def save_flashcards_to_file(data):
-    # Save the flashcards data to a JSON file with a timestamp in the filename.
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = f"flashcards_{timestamp}.json"
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=2)
 
+def read_flashcards_request(extract=True):
+    """
+    Reads the topic and card count of a flashcards request, from either a PDF
+    upload with form fields or a JSON body.
 
-@app.route("/flashcards", methods=["POST"])
-def flashcards_api():
+    Args:
+        extract (bool): Extract PDF text now. When False, an uploaded PDF is
+            returned as a (pdf_bytes, first_page, last_page) tuple for later
+            extraction by extract_pdf_text().
+
+    Returns:
+        tuple: (topic, number, None) on success, or (None, None, error_response).
+    """
     try:
-        if "file" in request.files:
-            file = request.files["file"]
-            if file.filename == "":
-                return jsonify({"error": "No selected file"}), 400
-            filename = file.filename
-            filepath = os.path.join("/tmp", filename)  # Save to a temporary directory
-            file.save(filepath)
-            # Read the PDF file and extract text
-            try:
-                with open(filepath, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    extracted_text = ""
-                    for page in reader.pages:
-                        extracted_text += page.extract_text()
-                topic = extracted_text
-            except Exception as e:
-                return jsonify({"error": f"Failed to read PDF file: {str(e)}"}), 500
-            finally:
-                os.remove(filepath)  # Clean up the temporary file
-            number = request.form.get("number")
-            if not number:
-                return (
-                    jsonify(
-                        {"error": 'Please provide "number" in the request form data.'}
-                    ),
-                    400,
-                )
-        else:
-            data = request.get_json()
-            if not data:
-                return jsonify({"error": "No JSON data provided."}), 400
-            topic = data.get("topic")
-            number = data.get("number")
-            if not topic:
-                return (
-                    jsonify({"error": 'Please provide "topic" in the request body.'}),
-                    400,
-                )
-            if not number:
-                return (
-                    jsonify({"error": 'Please provide "number" in the request body.'}),
-                    400,
+        files = request.files
+    except RequestEntityTooLarge:
+        return _request_error(
+            f"The PDF is larger than {MAX_PDF_BYTES // (1024 * 1024)} MB.", 413
+        )
+    if "file" in files:
+        file = files["file"]
+        if file.filename == "":
+            return _request_error("No selected file")
+        # Parse the PDF straight from memory instead of a temporary file
+        try:
+            first_page = int(request.form.get("first_page", 1))
+            last_page = request.form.get("last_page")
+            last_page = int(last_page) if last_page else None
+        except ValueError:
+            return _request_error('"first_page" and "last_page" must be integers.')
+        try:
+            with stage("upload_read"):
+                pdf_bytes = file.read(MAX_PDF_BYTES + 1)
+            if len(pdf_bytes) > MAX_PDF_BYTES:
+                return _request_error(
+                    f"The PDF is larger than {MAX_PDF_BYTES // (1024 * 1024)} MB.", 413
                 )
-        number = int(number)
-        flashcards_data = generate_flashcards(topic, number)
+            if extract:
+                with stage("pdf_extract"):
+                    topic = extract_pdf_text(pdf_bytes, first_page, last_page)
+            else:
+                topic = (pdf_bytes, first_page, last_page)
+        except ValueError as e:
+            return _request_error(str(e))
+        except Exception as e:
+            return _request_error(f"Failed to read PDF file: {str(e)}", 500)
+        number = request.form.get("number")
+        if not number:
+            return _request_error('Please provide "number" in the request form data.')
+    else:
+        data = request.get_json()
+        if not data:
+            return _request_error("No JSON data provided.")
+        topic = data.get("topic")
+        number = data.get("number")
+        if not topic:
+            return _request_error('Please provide "topic" in the request body.')
+        if not number:
+            return _request_error('Please provide "number" in the request body.')
+    return topic, int(number), None
+
+
+def run_flashcards_job(topic, number):
+    # PDF uploads are extracted on the worker so the request returns immediately
+    if isinstance(topic, tuple):
+        with stage("pdf_extract"):
+            topic = extract_pdf_text(*topic)
+    flashcards_data = generate_flashcards_chunked(topic, number)
+    if not flashcards_data:
+        raise RuntimeError("Failed to generate flashcards.")
+    with stage("deck_save"):
+        deck_id = deck_store.save(flashcards_data)
+    return {**flashcards_data, "deck_id": deck_id}
+
+
+def submit_flashcards_job():
+    topic, number, error = read_flashcards_request(extract=False)
+    if error:
+        return error
+    if request.is_json:
+        callback_url = (request.get_json() or {}).get("callback_url")
+    else:
+        callback_url = request.form.get("callback_url")
+    try:
+        job_id = job_queue.submit(
+            run_flashcards_job, topic, number, callback_url=callback_url
+        )
+    except CallbackURLError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    return (
+        jsonify({"job_id": job_id, "status_url": url_for(".get_job", job_id=job_id)}),
+        202,
+    )
+
+
+@bp.route("/flashcards", methods=["POST"])
+def flashcards_api():
+    try:
+        # Job mode returns a job ID at once and generates the deck in the background
+        if request.args.get("mode") == "job":
+            return submit_flashcards_job()
+
+        topic, number, error = read_flashcards_request()
+        if error:
+            return error
+        flashcards_data = generate_flashcards_chunked(topic, number)
         if not flashcards_data:
             return jsonify({"error": "Failed to generate flashcards."}), 500
-        save_flashcards_to_file(flashcards_data)
-        return jsonify(flashcards_data), 200
+        with stage("deck_save"):
+            deck_id = deck_store.save(flashcards_data)
+        return jsonify({**flashcards_data, "deck_id": deck_id}), 200
     except Exception as e:
         # Log the exception details
         import traceback
@@ -197,123 +520,317 @@ def flashcards_api():
         return jsonify({"error": "Internal Server Error", "message": str(e)}), 500
 
 
-@app.route("/evaluate_answers", methods=["POST"])
-def evaluate_answers():
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found."}), 404
+    return jsonify(job), 200
+
+
+@bp.route("/jobs/stats", methods=["GET"])
+def job_stats():
+    return jsonify(job_queue.stats()), 200
+
+
+@bp.route("/flashcards/stream", methods=["POST"])
+def flashcards_stream_api():
     try:
-        # Get user's answers from the request
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON data provided."}), 400
-        answers = data.get("answers")
-        if not answers:
-            return (
-                jsonify({"error": 'Please provide "answers" in the request body.'}),
-                400,
-            )
+        topic, number, error = read_flashcards_request()
+        if error:
+            return error
+    except Exception as e:
+        import traceback
 
-        # Read the latest flashcards JSON file
-        import glob
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error", "message": str(e)}), 500
 
-        list_of_files = glob.glob("flashcards_*.json")
-        if not list_of_files:
-            return jsonify({"error": "No flashcards file found."}), 500
-        latest_file = max(list_of_files, key=os.path.getctime)
-        with open(latest_file, "r") as f:
-            flashcards_data = json.load(f)
+    def events():
+        # One JSON object per line, flushed as soon as it is available
+        for event in iterate_sync(stream_flashcards_async(topic, number)):
+            yield json.dumps(event) + "\n"
+
+    return Response(events(), mimetype="application/x-ndjson")
+
+
+@bp.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    return (
+        jsonify(
+            {
+                "flashcards": flashcard_cache.stats(),
+                "verdicts": verdict_cache.stats(),
+                "pdf_pages": get_page_cache().stats(),
+            }
+        ),
+        200,
+    )
 
-        flashcards = flashcards_data.get("flashcards")
-        if not flashcards:
-            return jsonify({"error": "No flashcards found in the file."}), 500
 
-        # Prepare the prompt for Mistral
-        prompt = "You are an assistant that evaluates user's answers to flashcards.\n"
-        prompt += "Here are the flashcards with their correct answers:\n\n"
+@bp.route("/parse_stats", methods=["GET"])
+def parse_stats():
+    return jsonify(get_parse_stats()), 200
 
-        for idx, flashcard in enumerate(flashcards, start=1):
-            prompt += f"{idx}. Question: {flashcard['front']}\n"
-            prompt += f"   Answer: {flashcard['back']}\n\n"
 
-        prompt += "The user has provided the following answers:\n\n"
+def _verdict_key(flashcards, key, user_answer):
+    try:
+        idx = int(key) - 1
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= idx < len(flashcards):
+        return None
+    card = flashcards[idx]
+    card_hash = make_key(card["front"], card["back"])
+    return make_key(card_hash, normalize_answer(user_answer), MODEL, PROMPT_VERSION)
+
+
+def build_evaluation_prompt(flashcards, answers):
+    # Only the cards that were answered are included, numbered as in the deck
+    indices = []
+    for key in answers:
+        try:
+            idx = int(key)
+        except (TypeError, ValueError):
+            indices = range(1, len(flashcards) + 1)
+            break
+        if 1 <= idx <= len(flashcards):
+            indices.append(idx)
+
+    parts = [
+        "You are an assistant that evaluates user's answers to flashcards.\n",
+        "Here are the flashcards with their correct answers:\n\n",
+    ]
+    for idx in indices:
+        flashcard = flashcards[idx - 1]
+        parts.append(f"{idx}. Question: {flashcard['front']}\n")
+        parts.append(f"   Answer: {flashcard['back']}\n\n")
+
+    parts.append("The user has provided the following answers:\n\n")
+    for key, user_answer in answers.items():
+        parts.append(f"{key}. {user_answer}\n\n")
+
+    parts.append(
+        "For each question, evaluate the user's answer compared to the correct answer. "
+        "Provide feedback on the correctness, and assign a score out of 10 for each answer. "
+        "Return the evaluation as a JSON object with the question number as the key, and the evaluation as the value. "
+        'Each evaluation must be an object of the form {"score": <integer from 0 to 10>, "feedback": "<feedback>"}.\n\n'
+        "Output all mathematics in LaTeX format."
+        "INSANELY IMPORTANT: Do not include any markdown or code block formatting in your response and double check that you are outputting a JSON ONLY as it will get parsed into a JSON file"
+    )
+    return "".join(parts)
+
+
+def batch_answers(
+    flashcards,
+    answers,
+    max_tokens=EVALUATION_BATCH_TOKENS,
+    max_questions=EVALUATION_BATCH_QUESTIONS,
+):
+    """
+    Splits answers into batches that each fit one evaluation prompt.
+
+    Args:
+        flashcards (list): The deck's flashcards.
+        answers (dict): User answers keyed by question number.
+        max_tokens (int): Estimated tokens of cards and answers per batch.
+        max_questions (int): Questions per batch.
+
+    Returns:
+        list: Dicts of answers, in the order of the input.
+    """
+    batches, batch, batch_tokens = [], {}, 0
+    for key, user_answer in answers.items():
+        tokens = estimate_tokens(str(user_answer))
+        try:
+            card = flashcards[int(key) - 1] if int(key) >= 1 else None
+        except (TypeError, ValueError, IndexError):
+            card = None
+        if card is not None:
+            tokens += estimate_tokens(card["front"]) + estimate_tokens(card["back"])
+        if batch and (
+            batch_tokens + tokens > max_tokens or len(batch) >= max_questions
+        ):
+            batches.append(batch)
+            batch, batch_tokens = {}, 0
+        batch[key] = user_answer
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def evaluate_batch_async(flashcards, answers):
+    """
+    Evaluates one batch of answers with a single model call.
+
+    Args:
+        flashcards (list): The deck's flashcards.
+        answers (dict): The batch's answers keyed by question number.
+
+    Returns:
+        tuple: (evaluation, seconds) where evaluation maps the batch's question
+            numbers to {'score', 'feedback'}.
+
+    Raises:
+        RuntimeError: If the model call fails.
+        ValueError: If the reply cannot be parsed.
+    """
+    started = time.monotonic()
+    prompt = build_evaluation_prompt(flashcards, answers)
+    # A student is waiting: evaluation overtakes queued generations, and the
+    # repair call shares the deadline of the first one
+    deadline = llm_client.default_deadline(INTERACTIVE)
 
-        for key, user_answer in answers.items():
-            prompt += f"{key}. {user_answer}\n\n"
+    # Make the API call
+    try:
+        response_content = await llm_client.complete_async(
+            prompt, MODEL, kind="evaluate", priority=INTERACTIVE, deadline=deadline
+        )
+    except Exception as e:
+        log(f"API call failed: {e}")
+        raise RuntimeError("Failed to get response from Mistral API.") from e
 
-        prompt += (
-            "For each question, evaluate the user's answer compared to the correct answer. "
-            "Provide feedback on the correctness, and assign a score out of 10 for each answer. "
-            "Return the evaluation as a JSON object with the question number as the key, and the evaluation as the value.\n\n"
-            "Output all mathematics in LaTeX format."
-            "INSANELY IMPORTANT: Do not include any markdown or code block formatting in your response and double check that you are outputting a JSON ONLY as it will get parsed into a JSON file"
+    # Parse the response as JSON
+    try:
+        evaluation = await parse_llm_json(
+            response_content, validate_evaluation, INTERACTIVE, deadline
+        )
+    except Exception as e:
+        log(f"Error: {e}")
+        log(f"Response content: {response_content}")
+        raise ValueError("Failed to parse the response as JSON.") from e
+
+    # Keys outside the batch would overwrite the results of other batches
+    keys = {str(key) for key in answers}
+    evaluation = {key: value for key, value in evaluation.items() if key in keys}
+    return evaluation, time.monotonic() - started
+
+
+def _batch_key(batch, verdict_keys):
+    # Question numbers are part of the key because they key the verdicts
+    keys = [str(key) for key in batch]
+    if not all(key in verdict_keys for key in keys):
+        return None
+    return make_key(sorted((key, verdict_keys[key]) for key in keys))
+
+
+async def evaluate_batches_async(flashcards, batches, verdict_keys):
+    # All batches run concurrently, so latency follows the slowest batch, and a
+    # batch identical to one already in flight joins it
+    async def evaluate(batch):
+        batch_key = _batch_key(batch, verdict_keys)
+        if batch_key is None:
+            return await evaluate_batch_async(flashcards, batch)
+        return await evaluation_flight.do(
+            batch_key, lambda: evaluate_batch_async(flashcards, batch)
         )
 
-        # Initialize Mistral client
-        api_key = "wjJKh2KEYQ7ALYbrbbFnDspPpxLxfYsT"
-        model = "mistral-large-latest"
+    return await asyncio.gather(
+        *(evaluate(batch) for batch in batches), return_exceptions=True
+    )
 
-        try:
-            client = Mistral(api_key=api_key)
-        except Exception as e:
-            print(f"Failed to initialize Mistral client: {e}")
-            return jsonify({"error": "Failed to initialize Mistral client."}), 500
 
-        # Make the API call
-        try:
-            chat_response = client.chat.complete(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    },
-                ],
-            )
-        except Exception as e:
-            print(f"API call failed: {e}")
-            return jsonify({"error": "Failed to get response from Mistral API."}), 500
+def _error_status(error):
+    # Overload upstream is reported as such, so clients know to retry later
+    if isinstance(error.__cause__, DeadlineExceeded):
+        return 504
+    if isinstance(error.__cause__, llm_client.LLMUnavailableError):
+        return 503
+    return 500
 
-        # Extract the response content
-        try:
-            response_content = chat_response.choices[0].message.content.strip()
-        except (AttributeError, IndexError) as e:
-            print(f"Unexpected API response structure: {e}")
-            print("Full response:", chat_response)
-            return jsonify({"error": "Unexpected API response structure."}), 500
-        
-        # Make the API call for validation
 
+def _evaluation_response(data, deck_id, evaluation):
+    # Results feed the user's review schedule; only decks named by ID can be
+    # reviewed later
+    user_id = data.get("user")
+    if user_id and deck_id:
+        scores = {}
+        for key, verdict in evaluation.items():
+            try:
+                scores[int(key)] = float(verdict["score"])
+            except (KeyError, TypeError, ValueError):
+                continue
         try:
-            chat_response = client.chat.complete(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    },
-                ],
-            )
+            with stage("review_record"):
+                review_scheduler.record(str(user_id), deck_id, scores)
         except Exception as e:
-            print(f"API call failed: {e}")
-            return jsonify({"error": "Failed to get response from Mistral API."}), 500
+            log(f"Failed to record reviews: {e}")
+    return jsonify(evaluation), 200
 
-        # Extract the response content
-        try:
-            valid_response_content = chat_response.choices[0].message.content.strip()
-        except (AttributeError, IndexError) as e:
-            print(f"Unexpected API response structure: {e}")
-            print("Full response:", chat_response)
-            return jsonify({"error": "Unexpected API response structure."}), 500
 
+@bp.route("/evaluate_answers", methods=["POST"])
+def evaluate_answers():
+    try:
+        # Get user's answers from the request
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No JSON data provided."}), 400
+        answers = data.get("answers")
+        if not answers:
+            return (
+                jsonify({"error": 'Please provide "answers" in the request body.'}),
+                400,
+            )
+
+        # Look up the deck the answers belong to, falling back to the latest
+        # deck for clients that do not send a deck_id yet
+        deck_id = data.get("deck_id")
+        if deck_id:
+            flashcards_data = deck_store.get(deck_id)
+            if flashcards_data is None:
+                return jsonify({"error": f"Deck {deck_id} not found."}), 404
+        else:
+            flashcards_data = deck_store.latest()
+            if flashcards_data is None:
+                return jsonify({"error": "No flashcards deck found."}), 500
 
-        # Parse the response as JSON
-        try:
-            evaluation = json.loads(valid_response_content)
-        except json.JSONDecodeError:
-            print("Error: Failed to parse the response as JSON.")
-            print("Response content:", response_content)
-            return jsonify({"error": "Failed to parse the response as JSON."}), 500
+        flashcards = flashcards_data.get("flashcards")
+        if not flashcards:
+            return jsonify({"error": "No flashcards found in the deck."}), 500
+
+        # Grade exact and equivalent answers locally; only the rest go to Mistral
+        with stage("pregrade"):
+            evaluation, remaining = pregrade(flashcards, answers)
+        # Then answer repeated submissions from the verdict cache
+        verdict_keys = {}
+        for key, user_answer in list(remaining.items()):
+            verdict_key = _verdict_key(flashcards, key, user_answer)
+            if verdict_key is None:
+                continue
+            verdict = verdict_cache.get(verdict_key)
+            if verdict is not None:
+                evaluation[str(key)] = verdict
+                del remaining[key]
+            else:
+                verdict_keys[str(key)] = verdict_key
+        if not remaining:
+            return _evaluation_response(data, deck_id, evaluation)
+
+        # Evaluate the rest in token-budgeted batches, concurrently
+        batches = batch_answers(flashcards, remaining)
+        outcomes = run_sync(evaluate_batches_async(flashcards, batches, verdict_keys))
+
+        error = None
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                error = error or outcome
+                continue
+            # Verdicts of successful batches are cached even if another batch
+            # failed, so a retry only pays for the failed one
+            llm_evaluation, seconds = outcome
+            for key, verdict in llm_evaluation.items():
+                if key in verdict_keys:
+                    verdict_cache.set(
+                        verdict_keys[key],
+                        verdict,
+                        cost_seconds=seconds / len(llm_evaluation),
+                    )
+            evaluation.update(llm_evaluation)
+        if error is not None:
+            return jsonify({"error": str(error)}), _error_status(error)
 
         # Return the evaluation to the user
-        return jsonify(evaluation), 200
+        return _evaluation_response(data, deck_id, evaluation)
 
     except Exception as e:
         # Log the exception details
@@ -323,5 +840,34 @@ def evaluate_answers():
         return jsonify({"error": "Internal Server Error", "message": str(e)}), 500
 
 
+@bp.route("/review/next", methods=["GET"])
+def review_next():
+    user_id = request.args.get("user")
+    if not user_id:
+        return jsonify({"error": 'Please provide "user" in the query string.'}), 400
+    try:
+        n = int(request.args.get("n", 10))
+    except ValueError:
+        return jsonify({"error": '"n" must be an integer.'}), 400
+    if not 1 <= n <= REVIEW_MAX_CARDS:
+        return (
+            jsonify({"error": f'"n" must be between 1 and {REVIEW_MAX_CARDS}.'}),
+            400,
+        )
+
+    cards = []
+    decks = {}
+    for due in review_scheduler.next_due(user_id, n):
+        if due["deck_id"] not in decks:
+            decks[due["deck_id"]] = deck_store.get(due["deck_id"]) or {}
+        flashcards = decks[due["deck_id"]].get("flashcards") or []
+        if not 1 <= due["question"] <= len(flashcards):
+            continue
+        cards.append({**due, "card": flashcards[due["question"] - 1]})
+    return jsonify({"user": user_id, "cards": cards}), 200
+
+
 if __name__ == "__main__":
-    app.run(port=5002, debug=True)
+    from app import create_app
+
+    create_app().run(port=5002, debug=True)
@@ -0,0 +1,218 @@
+import contextvars
+import ipaddress
+import json
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict
+
+from metrics import log
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class CallbackURLError(ValueError):
+    """Raised when a callback URL is not a public http(s) address."""
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+# Redirects are not followed, so a public callback cannot bounce to an internal one
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def check_callback_url(url):
+    """
+    Checks that a callback URL is http(s) and that every address its host
+    resolves to is public, so callbacks cannot reach loopback, private,
+    link-local (including cloud metadata at 169.254.169.254) or reserved hosts.
+
+    Args:
+        url (str): The callback URL.
+
+    Raises:
+        CallbackURLError: If the URL is malformed, uses another scheme or
+            resolves to a non-public address.
+    """
+    try:
+        parsed = urllib.parse.urlsplit(url)
+        port = parsed.port
+    except (TypeError, ValueError) as e:
+        raise CallbackURLError(f"Invalid callback URL: {e}")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackURLError("The callback URL must be an http or https URL.")
+    try:
+        infos = socket.getaddrinfo(
+            parsed.hostname, port or parsed.scheme, type=socket.SOCK_STREAM
+        )
+    except (socket.gaierror, UnicodeError) as e:
+        raise CallbackURLError(f"Cannot resolve the callback host: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise CallbackURLError(
+                f"The callback host resolves to a non-public address ({address})."
+            )
+
+
+class JobQueue:
+    """
+    In-process job queue executed by a fixed pool of worker threads.
+
+    Finished jobs are kept for polling until max_finished newer jobs have
+    finished after them. When a job has a callback URL, its final state is
+    POSTed there as JSON.
+    """
+
+    def __init__(self, workers=4, max_pending=100, max_finished=1000, callback_timeout=10):
+        """
+        Args:
+            workers (int): Number of worker threads.
+            max_pending (int): Maximum number of queued jobs before submit() fails.
+            max_finished (int): Number of finished jobs kept for polling.
+            callback_timeout (float): Seconds to wait for a callback URL to respond.
+        """
+        self.max_finished = max_finished
+        self.callback_timeout = callback_timeout
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._counts = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0}
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        for idx in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{idx}", daemon=True).start()
+
+    def submit(self, func, *args, callback_url=None):
+        """
+        Queues func(*args) for execution. It runs with a copy of the caller's
+        context variables, so log lines keep the submitting request's trace ID.
+
+        Args:
+            func (callable): The job body; its return value becomes the job result.
+            *args: Arguments passed to func.
+            callback_url (str): Optional URL that receives the finished job.
+
+        Returns:
+            str: The job ID.
+
+        Raises:
+            CallbackURLError: If callback_url is not a public http(s) URL.
+            QueueFullError: If max_pending jobs are already waiting.
+        """
+        if callback_url:
+            check_callback_url(callback_url)
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "callback_url": callback_url,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._pending.put_nowait((job_id, func, args, contextvars.copy_context()))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                self._counts["rejected"] += 1
+            raise QueueFullError("The job queue is full, please retry later.")
+        with self._lock:
+            self._counts["submitted"] += 1
+        return job_id
+
+    def get(self, job_id):
+        """
+        Args:
+            job_id (str): The ID returned by submit().
+
+        Returns:
+            dict: A copy of the job's state, or None if the ID is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Queue depth, running jobs, outcome counters and wait/run times.
+        """
+        with self._lock:
+            finished = self._counts["succeeded"] + self._counts["failed"]
+            started = finished + self._running
+            return {
+                "queue_depth": self._pending.qsize(),
+                "running": self._running,
+                **self._counts,
+                "avg_wait_seconds": self._wait_seconds / started if started else 0.0,
+                "max_wait_seconds": self._max_wait_seconds,
+                "avg_run_seconds": self._run_seconds / finished if finished else 0.0,
+            }
+
+    def _work(self):
+        while True:
+            job_id, func, args, context = self._pending.get()
+            started = time.time()
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = started
+                wait = started - job["submitted_at"]
+                self._wait_seconds += wait
+                self._max_wait_seconds = max(self._max_wait_seconds, wait)
+                self._running += 1
+
+            try:
+                result, error, status = context.run(func, *args), None, "succeeded"
+            except Exception as e:
+                result, error, status = None, str(e), "failed"
+
+            finished = time.time()
+            with self._lock:
+                job.update(status=status, result=result, error=error, finished_at=finished)
+                self._running -= 1
+                self._counts[status] += 1
+                self._run_seconds += finished - started
+                self._finished[job_id] = True
+                while len(self._finished) > self.max_finished:
+                    expired_id, _ = self._finished.popitem(last=False)
+                    self._jobs.pop(expired_id, None)
+                snapshot = dict(job)
+
+            if snapshot["callback_url"]:
+                self._send_callback(snapshot)
+
+    def _send_callback(self, job):
+        request = urllib.request.Request(
+            job["callback_url"],
+            data=json.dumps(job).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            # Checked again in case the host now resolves somewhere else
+            check_callback_url(job["callback_url"])
+            with _callback_opener.open(request, timeout=self.callback_timeout):
+                pass
+        except Exception as e:
+            log(f"Callback for job {job['job_id']} failed: {e}")
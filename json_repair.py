@@ -0,0 +1,262 @@
+import ast
+import json
+import re
+import threading
+
+from metrics import log
+
+_stats_lock = threading.Lock()
+# How model output was turned into JSON: parsed as is, fixed locally, fixed by
+# a second LLM call, or not at all
+parse_stats = {"clean": 0, "repaired": 0, "llm_repaired": 0, "failed": 0}
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?|\n?\s*```\s*$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+# A backslash before a LaTeX command (\frac, \theta, \neq) rather than a JSON
+# escape. \n is usually a real newline, so only known commands count there.
+_LATEX_COMMAND = (
+    r"[bfrt][a-zA-Z]|u(?![0-9a-fA-F]{4})"
+    r"|n(?:abla|eg|eq|e|exists|geq|i|leq|mid|ot|otin|u)(?![a-zA-Z])"
+)
+# \' is kept for the Python-literal fallback, where it is a valid escape
+_ESCAPE_RE = re.compile(
+    r"""\\\\|(?P<latex>\\(?=%s))|\\["'/bfnrtu]|\\""" % _LATEX_COMMAND
+)
+_SMART_QUOTES = "“”"
+
+
+def record(outcome):
+    """
+    Increments one of the parse_stats counters.
+
+    Args:
+        outcome (str): One of 'clean', 'repaired', 'llm_repaired' or 'failed'.
+    """
+    with _stats_lock:
+        parse_stats[outcome] += 1
+
+
+def get_parse_stats():
+    """
+    Returns:
+        dict: A snapshot of the parse_stats counters.
+    """
+    with _stats_lock:
+        return dict(parse_stats)
+
+
+def strip_code_fences(text):
+    """
+    Removes a surrounding markdown code block, if any.
+
+    Args:
+        text (str): Raw model output.
+
+    Returns:
+        str: The text without the opening and closing fences.
+    """
+    return _FENCE_RE.sub("", text.strip())
+
+
+def extract_json_object(text):
+    """
+    Returns the outermost {...} object in the text, skipping any prose around it.
+    Braces inside string literals are ignored.
+
+    Args:
+        text (str): Text containing a JSON object.
+
+    Returns:
+        str: The object source, or the input unchanged if no balanced object is found.
+    """
+    start = text.find("{")
+    if start == -1:
+        return text
+    depth, in_string, escaped = 0, False, False
+    for idx in range(start, len(text)):
+        char = text[idx]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : idx + 1]
+    return text[start:]
+
+
+def _escape(match):
+    text = match.group(0)
+    if match.group("latex") is not None or text == "\\":
+        return "\\\\"
+    return text
+
+
+def _has_latex(text):
+    return any(m.group("latex") is not None for m in _ESCAPE_RE.finditer(text))
+
+
+def _replace_smart_quotes(text):
+    # Smart quotes used as delimiters become '"'; inside a string they are text
+    chars = list(text)
+    in_string, escaped = False, False
+    for idx, char in enumerate(chars):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"' or (in_string != '"' and char in _SMART_QUOTES):
+                chars[idx] = '"'
+                in_string = False
+        elif char == '"' or char in _SMART_QUOTES:
+            in_string = char
+            chars[idx] = '"'
+    return "".join(chars)
+
+
+def _repair(text):
+    text = _replace_smart_quotes(text)
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    # LaTeX such as \( or \frac is not meant as a JSON escape; keep the backslash literal
+    return _ESCAPE_RE.sub(_escape, text)
+
+
+def _parse(text):
+    # "\frac" is valid JSON but decodes to a form feed, so LaTeX goes to repair
+    if not _has_latex(text):
+        try:
+            return json.loads(text), "clean"
+        except json.JSONDecodeError:
+            pass
+
+    repaired = _repair(text)
+    try:
+        return json.loads(repaired), "repaired"
+    except json.JSONDecodeError:
+        pass
+
+    # Single-quoted keys and strings are valid Python literals; the repaired
+    # text is used so that LaTeX escapes stay literal here too
+    try:
+        return ast.literal_eval(repaired), "repaired"
+    except (ValueError, SyntaxError, MemoryError, RecursionError) as e:
+        raise ValueError(f"Failed to parse the response as JSON: {e}") from e
+
+
+def parse_json(text):
+    """
+    Parses model output as JSON, tolerating code fences, surrounding prose,
+    trailing commas, smart quotes, invalid escapes and Python-style quoting.
+
+    Args:
+        text (str): Raw model output.
+
+    Returns:
+        The parsed value.
+
+    Raises:
+        ValueError: If no repair produces valid JSON.
+    """
+    value, outcome = _parse(extract_json_object(strip_code_fences(text)))
+    record(outcome)
+    return value
+
+
+def parse_fragment(text):
+    """
+    Parses a JSON value with the same repairs as parse_json(), without looking
+    for an enclosing object and without counting it in parse_stats. Used for
+    the pieces of a streamed reply, which are counted once as a whole.
+
+    Args:
+        text (str): A JSON value such as a string literal or an object.
+
+    Returns:
+        The parsed value.
+
+    Raises:
+        ValueError: If no repair produces valid JSON.
+    """
+    return _parse(text)[0]
+
+
+def validate_flashcards(data):
+    """
+    Checks a generated deck against the theory/flashcards schema and drops cards
+    without both sides.
+
+    Args:
+        data: The parsed model output.
+
+    Returns:
+        dict: {'theory': str, 'flashcards': [{'front': str, 'back': str}, ...]}
+
+    Raises:
+        ValueError: If the theory or the flashcard list is missing.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("The response JSON is not a dictionary.")
+    theory = data.get("theory")
+    flashcards_list = data.get("flashcards")
+    if not theory or not isinstance(theory, str) or not isinstance(flashcards_list, list):
+        raise ValueError(
+            "The response JSON does not contain 'theory' or 'flashcards' properly."
+        )
+
+    flashcards = []
+    for idx, card in enumerate(flashcards_list, start=1):
+        front = card.get("front") if isinstance(card, dict) else None
+        back = card.get("back") if isinstance(card, dict) else None
+        if front and back:
+            flashcards.append({"front": str(front), "back": str(back)})
+        else:
+            log(f"Warning: Flashcard {idx} is missing 'front' or 'back' field.")
+    if not flashcards:
+        raise ValueError("The response JSON does not contain any complete flashcards.")
+    return {"theory": theory, "flashcards": flashcards}
+
+
+def validate_evaluation(data):
+    """
+    Checks an evaluation against the schema
+    {question_number: {'score': 0-10, 'feedback': str}}.
+
+    Args:
+        data: The parsed model output.
+
+    Returns:
+        dict: The evaluation with question numbers as string keys and numeric scores.
+
+    Raises:
+        ValueError: If any entry does not match the schema.
+    """
+    if not isinstance(data, dict) or not data:
+        raise ValueError("The evaluation JSON is not a non-empty dictionary.")
+
+    evaluation = {}
+    for key, value in data.items():
+        if not isinstance(value, dict):
+            raise ValueError(f"Evaluation for question {key} is not an object.")
+        try:
+            score = float(value.get("score"))
+        except (TypeError, ValueError):
+            raise ValueError(f"Evaluation for question {key} has no numeric score.")
+        if not 0 <= score <= 10:
+            raise ValueError(f"Evaluation for question {key} has score {score} outside 0-10.")
+        feedback = value.get("feedback")
+        if not isinstance(feedback, str):
+            raise ValueError(f"Evaluation for question {key} has no feedback.")
+        evaluation[str(key)] = {
+            "score": int(score) if score.is_integer() else score,
+            "feedback": feedback,
+        }
+    return evaluation
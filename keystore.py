@@ -0,0 +1,284 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Length of the XChaCha20-Poly1305 master key, in bytes
+MASTER_KEY_BYTES = 32
+
+
+def load_master_key(path="keystore.key", allow_key_file=False):
+    """
+    Returns the master key from the KEYSTORE_MASTER_KEY environment variable
+    (hex). Only when allow_key_file is set, as in development, the key file at
+    path is used instead and created with owner-only permissions if it does not
+    exist yet; a key kept next to the keystore would otherwise end up in
+    backups and images together with the data it protects.
+
+    Args:
+        path (str): The key file used when the environment variable is unset.
+        allow_key_file (bool): Fall back to the key file.
+
+    Returns:
+        bytes: The master key.
+
+    Raises:
+        RuntimeError: If KEYSTORE_MASTER_KEY is unset and allow_key_file is not.
+        ValueError: If the configured key has the wrong length.
+    """
+    key_hex = os.environ.get("KEYSTORE_MASTER_KEY")
+    if key_hex:
+        key = bytes.fromhex(key_hex)
+    elif not allow_key_file:
+        raise RuntimeError(
+            "KEYSTORE_MASTER_KEY is not set; generate one with "
+            "python -c 'import os; print(os.urandom(32).hex())'."
+        )
+    else:
+        try:
+            with open(path, "rb") as file:
+                key = file.read()
+        except FileNotFoundError:
+            key = os.urandom(MASTER_KEY_BYTES)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as file:
+                file.write(key)
+    if len(key) != MASTER_KEY_BYTES:
+        raise ValueError(f"The keystore master key must be {MASTER_KEY_BYTES} bytes.")
+    return key
+
+
+class KeyStore:
+    """
+    Encrypted store of wallet secrets, one row per wallet_id.
+
+    Secrets are sealed with XChaCha20-Poly1305 under a master key, with the
+    wallet_id as associated data so a row cannot be moved to another wallet.
+    Decrypted private keys are kept in a bounded in-memory cache for at most
+    cache_ttl seconds after they were read.
+    """
+
+    def __init__(
+        self,
+        path="keystore.sql",
+        key_path="keystore.key",
+        cache_ttl=300,
+        max_cached=10000,
+        allow_key_file=False,
+    ):
+        """
+        Args:
+            path (str): The SQLite database file.
+            key_path (str): The master key file, see load_master_key().
+            allow_key_file (bool): Read or create key_path when
+                KEYSTORE_MASTER_KEY is unset; meant for development only.
+            cache_ttl (float): Seconds a decrypted key stays cached; 0 disables
+                the cache.
+            max_cached (int): Maximum number of decrypted keys held in memory.
+        """
+        self.path = path
+        self.key_path = key_path
+        self.allow_key_file = allow_key_file
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self._master_key = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS keys (
+                wallet_id TEXT PRIMARY KEY,
+                nonce BLOB NOT NULL,
+                secret BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _key(self):
+        # Loaded on first use so that importing the app never creates a key file
+        if self._master_key is None:
+            self._master_key = load_master_key(self.key_path, self.allow_key_file)
+        return self._master_key
+
+    def unlock(self):
+        """
+        Loads the master key now, so that a missing or malformed key fails at
+        startup instead of on the first wallet request.
+
+        Raises:
+            RuntimeError: If no master key is configured.
+            ValueError: If the configured key has the wrong length.
+        """
+        self._key()
+
+    def _seal(self, wallet_id, private_key, mnemonic):
+        from nacl.bindings import crypto_aead_xchacha20poly1305_ietf_encrypt
+        from nacl.utils import random
+
+        if isinstance(private_key, str):
+            private_key = bytes.fromhex(private_key)
+        payload = json.dumps({"private_key": private_key.hex(), "mnemonic": mnemonic})
+        nonce = random(24)
+        secret = crypto_aead_xchacha20poly1305_ietf_encrypt(
+            payload.encode(), wallet_id.encode(), nonce, self._key()
+        )
+        return (wallet_id, nonce, secret, time.time())
+
+    def _open(self, wallet_id, nonce, secret):
+        from nacl.bindings import crypto_aead_xchacha20poly1305_ietf_decrypt
+
+        payload = crypto_aead_xchacha20poly1305_ietf_decrypt(
+            secret, wallet_id.encode(), nonce, self._key()
+        )
+        return json.loads(payload)
+
+    def put_many(self, entries):
+        """
+        Stores the secrets of new wallets in one transaction. A wallet_id that
+        already has a key keeps it; keys are never overwritten.
+
+        Args:
+            entries (list): (wallet_id, private_key, mnemonic) tuples, with the
+                private key as bytes or hex and the mnemonic as a string or None.
+
+        Returns:
+            list: The wallet IDs whose secrets were stored.
+        """
+        rows = [self._seal(*entry) for entry in entries]
+        inserted = []
+        conn = self._connection()
+        with conn:
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO keys (wallet_id, nonce, secret, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    row,
+                )
+                if cursor.rowcount:
+                    inserted.append(row[0])
+        return inserted
+
+    def put(self, wallet_id, private_key, mnemonic=None):
+        """
+        Stores the secrets of one new wallet, see put_many().
+
+        Returns:
+            bool: False if the wallet_id already had a key.
+        """
+        return bool(self.put_many([(wallet_id, private_key, mnemonic)]))
+
+    def add_mnemonic(self, wallet_id, mnemonic):
+        """
+        Adds the mnemonic to a stored key that was imported without one.
+
+        Returns:
+            bool: False if the wallet_id has no key.
+        """
+        secrets = self.load(wallet_id)
+        if secrets is None:
+            return False
+        _, nonce, secret, _ = self._seal(wallet_id, secrets["private_key"], mnemonic)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE keys SET nonce = ?, secret = ? WHERE wallet_id = ?",
+                (nonce, secret, wallet_id),
+            )
+        return True
+
+    def delete_many(self, wallet_ids):
+        """
+        Removes keys, e.g. those of a wallet creation that could not complete.
+
+        Args:
+            wallet_ids (list): The wallet IDs to remove.
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "DELETE FROM keys WHERE wallet_id = ?",
+                [(wallet_id,) for wallet_id in wallet_ids],
+            )
+        with self._lock:
+            for wallet_id in wallet_ids:
+                self._cache.pop(wallet_id, None)
+
+    def load(self, wallet_id):
+        """
+        Reads and decrypts a wallet's secrets, bypassing the cache.
+
+        Returns:
+            dict: 'private_key' (hex) and 'mnemonic', or None if the wallet_id
+                has no key.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT nonce, secret FROM keys WHERE wallet_id = ?", (wallet_id,))
+            .fetchone()
+        )
+        return self._open(wallet_id, *row) if row else None
+
+    def private_key(self, wallet_id):
+        """
+        Returns a wallet's private key, from the cache while it is fresh.
+
+        Args:
+            wallet_id (str): The unique wallet ID.
+
+        Returns:
+            bytes: The private key, or None if the wallet_id has no key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entry = self._cache.get(wallet_id)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        secrets = self.load(wallet_id)
+        if secrets is None:
+            return None
+        private_key = bytes.fromhex(secrets["private_key"])
+        if self.cache_ttl > 0:
+            with self._lock:
+                self._cache[wallet_id] = (private_key, now + self.cache_ttl)
+                self._cache.move_to_end(wallet_id)
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return private_key
+
+    def _purge(self, now):
+        # Must be called with the lock held. Entries are ordered by the time
+        # they were cached, so expired ones are always at the front.
+        while self._cache:
+            wallet_id, entry = next(iter(self._cache.items()))
+            if entry[1] > now:
+                break
+            del self._cache[wallet_id]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cache hits, misses and the number of keys held in memory.
+        """
+        with self._lock:
+            self._purge(time.monotonic())
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache)}
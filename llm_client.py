@@ -0,0 +1,322 @@
+import asyncio
+import os
+import random
+import time
+
+from event_loop import run_sync
+from llm_scheduler import BULK, INTERACTIVE, DeadlineExceeded, LLMScheduler
+from metrics import llm_request_seconds, llm_retries, llm_tokens, log
+from text_chunks import estimate_tokens
+
+# Retrieve API key from environment variable for security
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY", "wjJKh2KEYQ7ALYbrbbFnDspPpxLxfYsT")
+MODEL = "mistral-large-latest"
+# Maximum number of Mistral requests in flight across the whole process
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+# Quota of the Mistral workspace; a token rate of 0 leaves tokens unlimited
+MISTRAL_REQUESTS_PER_SECOND = float(os.environ.get("MISTRAL_REQUESTS_PER_SECOND", 5))
+MISTRAL_TOKENS_PER_MINUTE = float(os.environ.get("MISTRAL_TOKENS_PER_MINUTE", 0))
+# Time budget of a request, including queueing and retries, per priority
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", 120))
+LLM_INTERACTIVE_DEADLINE_SECONDS = float(
+    os.environ.get("LLM_INTERACTIVE_DEADLINE_SECONDS", 30)
+)
+# Retries of rate-limited and failed requests, with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_SECONDS = 0.5
+LLM_RETRY_MAX_SECONDS = 8.0
+
+_client = None
+_scheduler = None
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the API still rate limits or fails after all retries."""
+
+
+def get_client():
+    """
+    Returns the process-wide Mistral client. Its async HTTP pool lives on the
+    shared event loop, so connections are reused between requests.
+
+    Returns:
+        Mistral: The shared client.
+    """
+    global _client
+    if _client is None:
+        # Imported on first use: mistralai alone dominates the app's import time
+        import httpx
+        from mistralai import Mistral
+
+        async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONCURRENCY,
+                max_keepalive_connections=LLM_MAX_CONCURRENCY,
+            ),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        _client = Mistral(
+            api_key=MISTRAL_API_KEY,
+            server_url=os.environ.get("MISTRAL_SERVER_URL") or None,
+            async_client=async_client,
+        )
+    return _client
+
+
+def get_scheduler():
+    """
+    Returns the process-wide scheduler that admits Mistral requests. Created
+    lazily so it binds to the shared loop rather than the importing thread.
+
+    Returns:
+        LLMScheduler: The shared scheduler.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            LLM_MAX_CONCURRENCY,
+            requests_per_second=MISTRAL_REQUESTS_PER_SECOND,
+            tokens_per_minute=MISTRAL_TOKENS_PER_MINUTE,
+        )
+    return _scheduler
+
+
+def scheduler_stats():
+    return get_scheduler().stats() if _scheduler is not None else {}
+
+
+def default_deadline(priority=BULK):
+    """
+    Returns:
+        float: The time.monotonic() value by which a request of this priority
+            started now must be answered.
+    """
+    if priority == INTERACTIVE:
+        return time.monotonic() + LLM_INTERACTIVE_DEADLINE_SECONDS
+    return time.monotonic() + LLM_DEADLINE_SECONDS
+
+
+def _status_code(error):
+    # SDK errors carry the status themselves or on the raw httpx response
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "raw_response", None), "status_code", None)
+    return status
+
+
+def _retry_reason(error):
+    """
+    Returns:
+        str: Why the request is worth retrying, or None if it is not.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return str(status) if status == 429 or status >= 500 else None
+    import httpx
+
+    return "transport" if isinstance(error, httpx.TransportError) else None
+
+
+def _backoff(attempt, error):
+    # Full jitter spreads out the retries of requests that failed together
+    delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2**attempt))
+    headers = getattr(getattr(error, "raw_response", None), "headers", None) or {}
+    try:
+        return max(delay, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return delay
+
+
+async def _before_retry(error, attempt, deadline, model, kind):
+    # Re-raises error, or the reason to stop retrying, unless another attempt
+    # fits before the deadline
+    reason = _retry_reason(error)
+    if reason is None:
+        raise error
+    if attempt >= LLM_MAX_RETRIES:
+        raise LLMUnavailableError(f"Mistral API unavailable: {error}") from error
+    delay = _backoff(attempt, error)
+    if time.monotonic() + delay >= deadline:
+        raise DeadlineExceeded("No time left to retry the Mistral request.") from error
+    llm_retries.inc(model=model, kind=kind, reason=reason)
+    log(f"mistral kind={kind} retry={attempt + 1} reason={reason} delay={delay:.2f}")
+    await asyncio.sleep(delay)
+
+
+def _record_usage(model, kind, usage):
+    if usage is None:
+        return 0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    llm_tokens.inc(prompt_tokens, model=model, kind=kind, type="prompt")
+    llm_tokens.inc(completion_tokens, model=model, kind=kind, type="completion")
+    log(
+        f"mistral kind={kind} prompt_tokens={prompt_tokens} "
+        f"completion_tokens={completion_tokens}"
+    )
+    return prompt_tokens + completion_tokens
+
+
+def _outcome(error):
+    if isinstance(error, (asyncio.TimeoutError, DeadlineExceeded)):
+        return "timeout"
+    return "rate_limited" if _status_code(error) == 429 else "error"
+
+
+def _record_request(model, kind, started, outcome):
+    elapsed = time.monotonic() - started
+    llm_request_seconds.observe(elapsed, model=model, kind=kind, outcome=outcome)
+    log(f"mistral kind={kind} outcome={outcome} seconds={elapsed:.4f}")
+
+
+async def _until(deadline, awaitable):
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Mistral request did not finish before its deadline.")
+
+
+async def complete_async(prompt, model=MODEL, kind="chat", priority=BULK, deadline=None):
+    """
+    Sends a single-message chat completion and returns the reply text.
+    Rate-limited, failed and dropped requests are retried with backoff until
+    the deadline.
+
+    Args:
+        prompt (str): The user message.
+        model (str): The Mistral model name.
+        kind (str): What the request is for, used as a metrics label.
+        priority (int): llm_scheduler.INTERACTIVE or llm_scheduler.BULK.
+        deadline (float): time.monotonic() value to give up at; defaults to
+            default_deadline(priority).
+
+    Returns:
+        str: The stripped content of the first choice.
+
+    Raises:
+        ValueError: If the response does not contain a message.
+        DeadlineExceeded: If there is no answer before the deadline.
+        LLMUnavailableError: If the API keeps failing with retryable errors.
+    """
+    if deadline is None:
+        deadline = default_deadline(priority)
+    estimate = estimate_tokens(prompt)
+    attempt = 0
+    while True:
+        try:
+            async with get_scheduler().slot(priority, estimate, deadline) as charge:
+                started = time.monotonic()
+                try:
+                    chat_response = await _until(
+                        deadline,
+                        get_client().chat.complete_async(
+                            model=model,
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": prompt,
+                                },
+                            ],
+                        ),
+                    )
+                except Exception as e:
+                    _record_request(model, kind, started, _outcome(e))
+                    raise
+                _record_request(model, kind, started, "ok")
+                used = _record_usage(model, kind, getattr(chat_response, "usage", None))
+                if used:
+                    charge(used)
+            break
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            await _before_retry(e, attempt, deadline, model, kind)
+            attempt += 1
+    try:
+        return chat_response.choices[0].message.content.strip()
+    except (AttributeError, IndexError, TypeError) as e:
+        raise ValueError(f"Unexpected API response structure: {e}") from e
+
+
+def complete(prompt, model=MODEL, kind="chat", priority=BULK, deadline=None):
+    """
+    Blocking wrapper around complete_async for synchronous request handlers.
+
+    Args:
+        prompt (str): The user message.
+        model (str): The Mistral model name.
+        kind (str): What the request is for, used as a metrics label.
+        priority (int): llm_scheduler.INTERACTIVE or llm_scheduler.BULK.
+        deadline (float): time.monotonic() value to give up at.
+
+    Returns:
+        str: The stripped content of the first choice.
+    """
+    return run_sync(complete_async(prompt, model, kind, priority, deadline))
+
+
+async def stream_async(prompt, model=MODEL, kind="chat", priority=BULK, deadline=None):
+    """
+    Streams a single-message chat completion. Failures are retried like in
+    complete_async only until the first piece of text has been yielded; the
+    deadline bounds admission and the opening of the stream.
+
+    Args:
+        prompt (str): The user message.
+        model (str): The Mistral model name.
+        kind (str): What the request is for, used as a metrics label.
+        priority (int): llm_scheduler.INTERACTIVE or llm_scheduler.BULK.
+        deadline (float): time.monotonic() value to give up at.
+
+    Yields:
+        str: Pieces of the reply text as they arrive.
+    """
+    if deadline is None:
+        deadline = default_deadline(priority)
+    estimate = estimate_tokens(prompt)
+    attempt = 0
+    yielded = False
+    while True:
+        try:
+            async with get_scheduler().slot(priority, estimate, deadline) as charge:
+                started = time.monotonic()
+                outcome = "error"
+                try:
+                    response = await _until(
+                        deadline,
+                        get_client().chat.stream_async(
+                            model=model,
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": prompt,
+                                },
+                            ],
+                        ),
+                    )
+                    async with response as events:
+                        async for event in events:
+                            # Usage arrives with the final chunk
+                            usage = getattr(event.data, "usage", None)
+                            if usage is not None:
+                                charge(_record_usage(model, kind, usage))
+                            if not event.data.choices:
+                                continue
+                            delta = event.data.choices[0].delta.content
+                            if isinstance(delta, str) and delta:
+                                yielded = True
+                                yield delta
+                    outcome = "ok"
+                except Exception as e:
+                    outcome = _outcome(e)
+                    raise
+                finally:
+                    _record_request(model, kind, started, outcome)
+            return
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if yielded:
+                raise
+            await _before_retry(e, attempt, deadline, model, kind)
+            attempt += 1
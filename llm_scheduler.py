@@ -0,0 +1,156 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+# Lower values are served first
+INTERACTIVE = 0
+BULK = 1
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request cannot be admitted or completed before its deadline."""
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to capacity tokens and refills at rate
+    tokens per second. The level may go negative when actual usage turns out
+    higher than what was taken up front, which delays later requests.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate (float): Tokens added per second; 0 disables the bucket.
+            capacity (float): Maximum number of tokens held.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount):
+        """
+        Returns:
+            float: Seconds until amount tokens are available, 0 if they are now.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # Requests larger than the bucket only wait for a full bucket
+        missing = min(amount, self.capacity) - self._level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        if self.rate > 0:
+            self._refill()
+            self._level -= amount
+
+
+class LLMScheduler:
+    """
+    Admits model requests in priority order, within a concurrency limit and
+    within the request and token rates of the API quota.
+
+    Waiting requests are kept in a heap ordered by (priority, arrival), so an
+    interactive request overtakes queued bulk requests but never preempts a
+    running one. All methods must run on the shared event loop.
+    """
+
+    def __init__(self, max_concurrency, requests_per_second=0, tokens_per_minute=0):
+        """
+        Args:
+            max_concurrency (int): Requests in flight at once.
+            requests_per_second (float): Request rate quota; 0 for none.
+            tokens_per_minute (float): Token rate quota; 0 for none.
+        """
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self._waiters = []
+        self._arrivals = itertools.count()
+        self._running = 0
+        self._timer = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Requests running and waiting, per priority.
+        """
+        waiting = [entry for entry in self._waiters if not entry[3].done()]
+        return {
+            "running": self._running,
+            "waiting_interactive": sum(1 for entry in waiting if entry[0] == INTERACTIVE),
+            "waiting_bulk": sum(1 for entry in waiting if entry[0] != INTERACTIVE),
+        }
+
+    @asynccontextmanager
+    async def slot(self, priority=BULK, tokens=0, deadline=None):
+        """
+        Waits for the right to send one request.
+
+        Args:
+            priority (int): INTERACTIVE or BULK.
+            tokens (int): Estimated tokens the request will use.
+            deadline (float): time.monotonic() value after which to give up.
+
+        Yields:
+            callable: Call with the actual token count once known, to charge
+                the difference to the token bucket.
+
+        Raises:
+            DeadlineExceeded: If the request is not admitted before deadline.
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), tokens, future))
+        self._dispatch()
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                raise DeadlineExceeded("Timed out waiting for a model request slot.")
+        except BaseException:
+            if not future.cancel():
+                # Admitted just as the caller went away: give the slot back
+                self._release()
+            raise
+
+        def charge(actual_tokens):
+            self.tokens.take(actual_tokens - tokens)
+
+        try:
+            yield charge
+        finally:
+            self._release()
+
+    def _release(self):
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self._running < self.max_concurrency:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = max(self.requests.delay(1), self.tokens.delay(tokens))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._running += 1
+            future.set_result(None)
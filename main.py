@@ -1,168 +1,146 @@
 import os
-import sqlite3
-import asyncio
-from tonutils.client import TonapiClient
-from tonutils.wallet import PreprocessedWalletV2R1
-from tonutils.wallet.data import TransferData
-from tonutils.client import TonapiClient
-from tonutils.wallet import (
-    WalletV3R1,
-    # Uncomment the following lines to use different wallet versions:
-    # WalletV3R2,
-    # WalletV4R1,
-    # WalletV4R2,
-    # WalletV5R1,
-    # HighloadWalletV2,
-    # HighloadWalletV3,
-    # PreprocessedWalletV2,
-    # PreprocessedWalletV2R1,
+from flask import Blueprint, request, jsonify
+from wallet_management import (
+    RAW_KEY_BATCH_VERSION,
+    RAW_KEY_SEND_VERSION,
+    WALLET_VERSION,
+    WALLET_VERSIONS,
+    create_wallet,
+    create_wallets,
+    get_balance,
+    send_batch_sync,
+    send_sync,
+    wallet_sender,
 )
-from flask import Flask, request, jsonify
-
-# API key for accessing the Tonapi (obtainable from https://tonconsole.com)
-API_KEY = os.environ.get('TON_API_KEY', 'default_key')
-
-# Set to True for test network, False for main network
-IS_TESTNET = True
-
-app = Flask(__name__)
-
-async def send(private_key: str, send_to: str, amount: float):
-    """
-    Sends the specified amount to the given address using the private key.
-
-    Args:
-        private_key (str): The private key of the sender's wallet.
-        send_to (str): The recipient's wallet address.
-        amount (float): The amount to send (in TON).
-
-    Returns:
-        None
-    """
-    client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
-
-    # Create a KeyPair from the private key
-    keypair = KeyPair(private=private_key)
-
-    # Create the wallet using the keypair
-    wallet = PreprocessedWalletV2R1(client=client, keypair=keypair)
-
-    # Perform the transfer
-    tx_hash = await wallet.transfer(
-        destination=send_to,
-        amount=amount,
-        body="Transfer from tonutils",
-    )
-
-    print("Successfully transferred!")
-    print(f"Transaction hash: {tx_hash}")
-
-
-def create_db():
-    """
-    Creates a SQLite database 'users.sql' with a table 'users' and columns:
-    wallet_id, public_key, private_key, balance.
-
-    Returns:
-        None
-    """
-    conn = sqlite3.connect('users.sql')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            wallet_id TEXT PRIMARY KEY,
-            public_key TEXT NOT NULL,
-            private_key TEXT NOT NULL,
-            balance REAL NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    print("Database 'users.sql' created with table 'users'.")
-
-
-def create_wallet(wallet_id: str):
-    """
-    Generates a mnemonic, creates a wallet using it, saves the keys and mnemonic
-    to the 'wallets' folder, and writes wallet details to the database.
-
-    Args:
-        wallet_id (str): The unique wallet ID.
-
-    Returns:
-        None
-    """
-    client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
-
-    # Generate a new mnemonic and create the wallet
-    wallet_class = WalletV3R1
-    wallet, public_key, private_key, mnemonic = wallet_class.create(client)
-
-    mnemonic_str = " ".join(mnemonic)
-
-    # Save wallet information to a file
-    os.makedirs("wallets", exist_ok=True)
-    wallet_file = os.path.join("wallets", f"{wallet.address.to_str()}.txt")
-    with open(wallet_file, "w") as file:
-        file.write(f"Address: {wallet.address.to_str()}\n")
-        file.write(f"Public Key: {public_key}\n")
-        file.write(f"Private Key: {private_key}\n")
-        file.write(f"Mnemonic: {mnemonic_str}\n")
-
-    print(f"Wallet saved to {wallet_file}")
-
-    # Insert wallet details into the database
-    conn = sqlite3.connect('users.sql')
-    cursor = conn.cursor()
 
-    try:
-        cursor.execute('''
-            INSERT INTO users (wallet_id, public_key, private_key, balance)
-            VALUES (?, ?, ?, ?)
-        ''', (wallet_id, public_key, private_key, 0))
-        conn.commit()
-        print(f"Wallet details inserted into database with wallet_id: {wallet_id}")
-    except sqlite3.IntegrityError as e:
-        print(f"An error occurred while inserting into the database: {e}")
-    finally:
-        conn.close()
-
-
-@app.route('/create-wallet', methods=['POST'])
+# Largest number of wallet IDs accepted by a single /create-wallets call
+MAX_BATCH_WALLETS = int(os.environ.get('MAX_BATCH_WALLETS', 10000))
+
+# Private keys sent in request bodies are refused unless explicitly allowed;
+# senders are named by wallet_id and their keys read from the keystore
+ALLOW_RAW_PRIVATE_KEY = os.environ.get('ALLOW_RAW_PRIVATE_KEY', '0') == '1'
+
+# Registered on the application by app.create_app()
+bp = Blueprint('wallets', __name__)
+
+def _sender(data, raw_key_version):
+    # Senders are named by wallet_id and sign with their stored wallet version
+    wallet_id = data.get('wallet_id')
+    if not wallet_id:
+        if data.get('private_key') and not ALLOW_RAW_PRIVATE_KEY:
+            return None, None, (jsonify({'error': 'private_key is not accepted, pass wallet_id instead'}), 400)
+        return data.get('private_key'), raw_key_version, None
+    sender = wallet_sender(wallet_id)
+    if sender is None:
+        return None, None, (jsonify({'error': f'Unknown wallet_id: {wallet_id}'}), 404)
+    return sender[0], sender[1], None
+
+def _wallet_version(data):
+    # Payout wallets are created as highload_v3 so /send-batch packs many
+    # transfers into each message
+    version = data.get('wallet_version') or WALLET_VERSION
+    if version not in WALLET_VERSIONS:
+        return None, (jsonify({'error': f'wallet_version must be one of {sorted(WALLET_VERSIONS)}'}), 400)
+    return version, None
+
+@bp.route('/create-wallet', methods=['POST'])
 def create_wallet_endpoint():
     try:
         data = request.get_json()
         wallet_id = data.get('wallet_id')
         if not wallet_id:
             return jsonify({'error': 'wallet_id is required'}), 400
-            
-        create_wallet(wallet_id)
+        version, error = _wallet_version(data)
+        if error:
+            return error
+
+        create_wallet(wallet_id, version)
         return jsonify({'message': f'Wallet created successfully with ID: {wallet_id}'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/send', methods=['POST'])
-async def send_endpoint():
+@bp.route('/create-wallets', methods=['POST'])
+def create_wallets_endpoint():
+    try:
+        data = request.get_json()
+        wallet_ids = data.get('wallet_ids')
+        if not wallet_ids or not isinstance(wallet_ids, list):
+            return jsonify({'error': 'wallet_ids must be a non-empty list'}), 400
+        if not all(isinstance(wallet_id, str) and wallet_id for wallet_id in wallet_ids):
+            return jsonify({'error': 'every wallet_id must be a non-empty string'}), 400
+        if len(wallet_ids) > MAX_BATCH_WALLETS:
+            return jsonify({'error': f'at most {MAX_BATCH_WALLETS} wallet_ids per request'}), 400
+        version, error = _wallet_version(data)
+        if error:
+            return error
+
+        results = create_wallets(wallet_ids, version)
+        created = sum(1 for status in results.values() if status == 'created')
+        return jsonify({
+            'results': results,
+            'created': created,
+            'failed': len(results) - created,
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/send', methods=['POST'])
+def send_endpoint():
     try:
         data = request.get_json()
-        private_key = data.get('private_key')
+        private_key, version, error = _sender(data, RAW_KEY_SEND_VERSION)
+        if error:
+            return error
         send_to = data.get('send_to')
         amount = data.get('amount')
         
         if not all([private_key, send_to, amount]):
-            return jsonify({'error': 'private_key, send_to, and amount are required'}), 400
+            return jsonify({'error': 'wallet_id, send_to, and amount are required'}), 400
             
-        await send(private_key, send_to, float(amount))
-        return jsonify({'message': 'Transfer successful'}), 200
+        # Runs on the shared event loop instead of a new loop per request
+        tx_hash = send_sync(private_key, send_to, float(amount), version)
+        return jsonify({'message': 'Transfer successful', 'tx_hash': tx_hash}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/send-batch', methods=['POST'])
+def send_batch_endpoint():
+    try:
+        data = request.get_json()
+        private_key, version, error = _sender(data, RAW_KEY_BATCH_VERSION)
+        if error:
+            return error
+        transfers = data.get('transfers')
+
+        if not private_key or not transfers or not isinstance(transfers, list):
+            return jsonify({'error': 'wallet_id and a non-empty transfers list are required'}), 400
+        if not all(isinstance(transfer, dict) for transfer in transfers):
+            return jsonify({'error': 'every transfer must be an object'}), 400
+
+        results = send_batch_sync(private_key, transfers, version)
+        message_hashes = sorted({
+            result['message_hash'] for result in results if result['status'] == 'submitted'
+        })
+        return jsonify({'results': results, 'message_hashes': message_hashes}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/balance/<wallet_id>', methods=['GET'])
+def balance_endpoint(wallet_id):
+    try:
+        # Served from the users table, refreshed in the background by the balance sync
+        balance = get_balance(wallet_id)
+        if balance is None:
+            return jsonify({'error': f'Unknown wallet_id: {wallet_id}'}), 404
+        return jsonify(balance), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == "__main__":
-    # Create the database on startup
-    create_db()
-    
+    from app import create_app
+
     # Get port from environment variable (Cloud Run sets this automatically)
     port = int(os.environ.get('PORT', 8080))
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    # Run the Flask app; create_app() also creates the database
+    create_app().run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# ID of the request being handled, prefixed to log lines by log()
+trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        name += "{" + ",".join(f'{key}="{_escape(val)}"' for key, val in labels) + "}"
+    return f"{name} {float(value)!r}"
+
+
+class _Metric:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing value per combination of label values.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name + "_total", list(zip(self.label_names, key)), value
+
+
+class Histogram(_Metric):
+    """
+    Observations counted into cumulative buckets per combination of label values.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Bucket counts, then the sum and the count of all observations
+            entry = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[idx] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the with block, in seconds.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(entry)) for key, entry in self._values.items())
+        for key, entry in values:
+            labels = list(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, entry):
+                yield self.name + "_bucket", labels + [("le", repr(float(bound)))], count
+            yield self.name + "_bucket", labels + [("le", "+Inf")], entry[-1]
+            yield self.name + "_sum", labels, entry[-2]
+            yield self.name + "_count", labels, entry[-1]
+
+
+class Registry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+
+    Besides counters and histograms, stats() dicts already kept by other
+    components (caches, queues, ...) can be exported as gauges with
+    register_stats(), so they are read only when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def register_stats(self, prefix, stats):
+        """
+        Args:
+            prefix (str): Prepended to every key of the stats dict.
+            stats (callable): Returns a dict; its numeric values become gauges.
+        """
+        with self._lock:
+            self._stats[prefix] = stats
+
+    def render(self):
+        """
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats = list(self._stats.items())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(_format_sample(*sample) for sample in metric.samples())
+        for prefix, func in stats:
+            try:
+                values = func()
+            except Exception as e:
+                log(f"Reading {prefix} stats failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    name = f"{prefix}_{key}"
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(_format_sample(name, [], value))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.histogram(
+    "stage_duration_seconds", "Duration of request processing stages.", ["stage"]
+)
+http_request_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests.",
+    ["endpoint", "method", "status"],
+)
+llm_request_seconds = REGISTRY.histogram(
+    "mistral_request_duration_seconds",
+    "Duration of Mistral chat requests.",
+    ["model", "kind", "outcome"],
+)
+llm_tokens = REGISTRY.counter(
+    "mistral_tokens", "Tokens used by Mistral chat requests.", ["model", "kind", "type"]
+)
+llm_retries = REGISTRY.counter(
+    "mistral_retries", "Retried Mistral chat requests.", ["model", "kind", "reason"]
+)
+tonapi_request_seconds = REGISTRY.histogram(
+    "tonapi_request_duration_seconds",
+    "Duration of Tonapi requests.",
+    ["method", "path", "status"],
+)
+
+
+def log(message):
+    """
+    Prints a log line, prefixed with the current trace ID if there is one.
+    """
+    current = trace_id.get()
+    print(f"[{current}] {message}" if current else message)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a processing stage into stage_duration_seconds and logs its duration.
+
+    Args:
+        name (str): The stage label, e.g. 'pdf_extract' or 'deck_save'.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        stage_seconds.observe(elapsed, stage=name)
+        log(f"stage={name} seconds={elapsed:.4f}")
@@ -0,0 +1,168 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from result_cache import ResultCache, make_key
+
+# Upper bound on the number of pages extracted from a single upload
+MAX_PDF_PAGES = int(os.environ.get("PDF_MAX_PAGES", 300))
+# Uploads larger than this are refused before they are parsed
+MAX_PDF_BYTES = int(os.environ.get("PDF_MAX_MB", 50)) * 1024 * 1024
+# Pages handed to one worker process; smaller documents are extracted inline
+PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", 16))
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+# Extracted text is cached per page under the SHA-256 of the upload
+PDF_CACHE_PAGES = int(os.environ.get("PDF_CACHE_PAGES", 5000))
+PDF_CACHE_MB = int(os.environ.get("PDF_CACHE_MB", 64))
+PDF_CACHE_DISK_PAGES = int(os.environ.get("PDF_CACHE_DISK_PAGES", 200000))
+PDF_CACHE_TTL = float(os.environ.get("PDF_CACHE_TTL", 30 * 24 * 60 * 60))
+PDF_CACHE_PATH = os.environ.get("PDF_CACHE_PATH", "pdf_cache.sqlite")
+
+_executor = None
+_page_cache = None
+# In a worker process: the (path, reader) of the document it last opened
+_worker_reader = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Forking would copy the app's threads and open SQLite connections into
+        # the workers; forkserver starts them from a clean process instead
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _executor
+
+
+def get_page_cache():
+    """
+    Returns the cache of extracted page texts. Created on first use so the
+    pool's worker processes never open the SQLite file.
+
+    Returns:
+        ResultCache: The shared page cache.
+    """
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = ResultCache(
+            max_entries=PDF_CACHE_PAGES,
+            ttl_seconds=PDF_CACHE_TTL,
+            path=PDF_CACHE_PATH or None,
+            table="pdf_pages",
+            max_bytes=PDF_CACHE_MB * 1024 * 1024,
+            max_disk_entries=PDF_CACHE_DISK_PAGES,
+        )
+    return _page_cache
+
+
+def _extract_pages(path, page_numbers):
+    # Runs in a worker process; the document is read from the file written by
+    # extract_pdf_pages() and parsed once per worker, not once per slice
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        with open(path, "rb") as file:
+            _worker_reader = (path, _open(file.read()))
+    reader = _worker_reader[1]
+    return [reader.pages[i].extract_text() or "" for i in page_numbers]
+
+
+def extract_pdf_pages(pdf_bytes, first_page=1, last_page=None, max_pages=MAX_PDF_PAGES):
+    """
+    Extracts the text of a page range from an in-memory PDF.
+
+    Pages already extracted from the same document, identified by the SHA-256
+    of its bytes, come from the page cache; a fully cached range is returned
+    without parsing the PDF at all. Missing ranges longer than PAGES_PER_TASK
+    are split into slices that are extracted in parallel on a process pool.
+    The document reaches the workers as one temporary file rather than a copy
+    per slice.
+
+    Args:
+        pdf_bytes (bytes): The raw PDF document.
+        first_page (int): First page to extract, 1-based.
+        last_page (int): Last page to extract, inclusive. Defaults to the last page.
+        max_pages (int): Maximum number of pages extracted; the range is cut short
+            beyond it.
+
+    Returns:
+        list: The text of each extracted page, in page order.
+
+    Raises:
+        ValueError: If the document is larger than MAX_PDF_BYTES or the page
+            range does not fit it.
+    """
+    if len(pdf_bytes) > MAX_PDF_BYTES:
+        raise ValueError(
+            f"The PDF is larger than {MAX_PDF_BYTES // (1024 * 1024)} MB."
+        )
+    cache = get_page_cache()
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    reader = None
+    page_count = cache.get(make_key(digest, "page_count"))
+    if page_count is None:
+        reader = _open(pdf_bytes)
+        page_count = len(reader.pages)
+        cache.set(make_key(digest, "page_count"), page_count)
+    if last_page is None:
+        last_page = page_count
+    if first_page < 1 or last_page > page_count or first_page > last_page:
+        raise ValueError(
+            f"Invalid page range {first_page}-{last_page} for a {page_count} page document."
+        )
+
+    page_numbers = list(range(first_page - 1, last_page))[:max_pages]
+    texts = {i: cache.get(make_key(digest, i)) for i in page_numbers}
+    missing = [i for i in page_numbers if texts[i] is None]
+    if missing:
+        started = time.monotonic()
+        if len(missing) <= PAGES_PER_TASK:
+            reader = reader or _open(pdf_bytes)
+            extracted = [reader.pages[i].extract_text() or "" for i in missing]
+        else:
+            slices = [
+                missing[i : i + PAGES_PER_TASK]
+                for i in range(0, len(missing), PAGES_PER_TASK)
+            ]
+            executor = _get_executor()
+            with tempfile.NamedTemporaryFile(suffix=".pdf") as file:
+                file.write(pdf_bytes)
+                file.flush()
+                futures = [
+                    executor.submit(_extract_pages, file.name, pages) for pages in slices
+                ]
+                extracted = [text for future in futures for text in future.result()]
+        texts.update(zip(missing, extracted))
+        cache.set_many(
+            ((make_key(digest, i), texts[i]) for i in missing),
+            cost_seconds=(time.monotonic() - started) / len(missing),
+        )
+    return [texts[i] for i in page_numbers]
+
+
+def _open(pdf_bytes):
+    # Imported on first use to keep it off the cold start path
+    import PyPDF2
+
+    return PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+
+
+def extract_pdf_text(pdf_bytes, first_page=1, last_page=None, max_pages=MAX_PDF_PAGES):
+    """
+    Extracts the text of a page range from an in-memory PDF as one string.
+
+    Args:
+        pdf_bytes (bytes): The raw PDF document.
+        first_page (int): First page to extract, 1-based.
+        last_page (int): Last page to extract, inclusive. Defaults to the last page.
+        max_pages (int): Maximum number of pages extracted.
+
+    Returns:
+        str: The page texts joined with newlines.
+    """
+    return "\n".join(extract_pdf_pages(pdf_bytes, first_page, last_page, max_pages))
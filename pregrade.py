@@ -0,0 +1,153 @@
+import math
+import re
+
+# Relative tolerance when comparing numeric answers
+NUMERIC_REL_TOL = 1e-6
+CORRECT_FEEDBACK = "Correct. Your answer matches the expected answer."
+
+_LATEX_DELIMITERS_RE = re.compile(r"^\$+|\$+$|^\\\(|\\\)$|^\\\[|\\\]$")
+_LATEX_SPACING_RE = re.compile(r"\\[,;:! ]|\\quad|\\qquad|\\left|\\right")
+_LATEX_FRAC_RE = re.compile(r"\\[dt]?frac\{([^{}]*)\}\{([^{}]*)\}")
+_LATEX_TEXT_RE = re.compile(r"\\(?:text|mathrm|mathbf|operatorname)\{([^{}]*)\}")
+_LATEX_OPERATORS = {
+    "\\cdot": "*",
+    "\\times": "*",
+    "\\div": "/",
+    "\\le": "<=",
+    "\\ge": ">=",
+    "\\pi": "pi",
+}
+# Only answers made of words and longer than this are compared ignoring case;
+# short or symbolic ones such as 'Co' vs 'CO', 'pH' or 'f(x)' keep their case
+SYMBOLIC_MAX_LENGTH = 4
+_WORDS_RE = re.compile(r"^[^\W\d_]+(?:[-', ]+[^\W\d_]+)*$")
+# Parentheses around a single term, but not those of a call such as f(x)
+_GROUPING_PARENS_RE = re.compile(r"(?<![\w)\]}])\(([\w.]+)\)")
+_THOUSANDS_RE = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+_NUMBER_RE = re.compile(r"^[-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?$", re.IGNORECASE)
+
+
+def normalize_answer(text):
+    """
+    Normalizes whitespace and trailing punctuation of an answer, and its case
+    unless it is a short symbolic answer.
+
+    Args:
+        text (str): A user or reference answer.
+
+    Returns:
+        str: The normalized answer.
+    """
+    text = " ".join(str(text).split()).rstrip(".").strip()
+    if _WORDS_RE.match(text) and len(text) > SYMBOLIC_MAX_LENGTH:
+        return text.casefold()
+    return text
+
+
+def normalize_latex(text):
+    """
+    Rewrites simple LaTeX into a canonical plain form so that equivalent
+    spellings such as '\\frac{1}{2}' and '1/2' compare equal.
+
+    Args:
+        text (str): A normalized answer.
+
+    Returns:
+        str: The canonical form without whitespace.
+    """
+    text = _LATEX_DELIMITERS_RE.sub("", text.strip())
+    text = _LATEX_SPACING_RE.sub("", text)
+    text = _LATEX_TEXT_RE.sub(r"\1", text)
+    previous = None
+    while previous != text:
+        previous = text
+        text = _LATEX_FRAC_RE.sub(r"(\1)/(\2)", text)
+    for command, replacement in _LATEX_OPERATORS.items():
+        text = re.sub(re.escape(command) + r"(?![a-z])", replacement, text)
+    text = re.sub(r"\^\{([^{}]*)\}", r"^\1", text)
+    text = _GROUPING_PARENS_RE.sub(r"\1", text)
+    return re.sub(r"\s+", "", text)
+
+
+def parse_number(text):
+    """
+    Parses a plain number or a simple fraction of two numbers. Fractions are
+    not evaluated, since '2/4' is not an answer to a card asking to simplify.
+
+    Args:
+        text (str): Canonical answer text from normalize_latex().
+
+    Returns:
+        tuple: (numerator, denominator) as floats, with a denominator of 1 for
+            a plain number, or None if the text is not a simple number.
+    """
+    text = _THOUSANDS_RE.sub("", text)
+    parts = text.split("/")
+    if len(parts) > 2 or not all(_NUMBER_RE.match(part) for part in parts):
+        return None
+    numerator = float(parts[0])
+    denominator = float(parts[1]) if len(parts) == 2 else 1.0
+    if denominator == 0:
+        return None
+    return numerator, denominator
+
+
+def is_certainly_correct(user_answer, expected_answer):
+    """
+    Decides whether an answer is correct without any model call. A False result
+    means "unknown", not "wrong".
+
+    Args:
+        user_answer (str): The answer given by the user.
+        expected_answer (str): The back of the flashcard.
+
+    Returns:
+        bool: True if the answers are equal after normalization, equal as
+            simple LaTeX expressions, or numbers (fractions term by term) equal
+            within NUMERIC_REL_TOL.
+    """
+    user, expected = normalize_answer(user_answer), normalize_answer(expected_answer)
+    if not user:
+        return False
+    if user == expected:
+        return True
+
+    user, expected = normalize_latex(user), normalize_latex(expected)
+    if user == expected:
+        return True
+    user_value, expected_value = parse_number(user), parse_number(expected)
+    if user_value is None or expected_value is None:
+        return False
+    # No absolute tolerance: 1e-13 is not an answer for 0
+    return all(
+        math.isclose(a, b, rel_tol=NUMERIC_REL_TOL)
+        for a, b in zip(user_value, expected_value)
+    )
+
+
+def pregrade(flashcards, answers):
+    """
+    Scores the answers that can be graded locally with certainty.
+
+    Args:
+        flashcards (list): The deck's flashcards, each with 'front' and 'back'.
+        answers (dict): User answers keyed by 1-based question number.
+
+    Returns:
+        tuple: (graded, remaining) where graded maps question numbers to
+            {'score', 'feedback'} evaluations and remaining holds the answers
+            that still need the model.
+    """
+    graded, remaining = {}, {}
+    for key, user_answer in answers.items():
+        try:
+            idx = int(key) - 1
+        except (TypeError, ValueError):
+            idx = -1
+        if 0 <= idx < len(flashcards) and is_certainly_correct(
+            user_answer, flashcards[idx]["back"]
+        ):
+            graded[str(key)] = {"score": 10, "feedback": CORRECT_FEEDBACK}
+        else:
+            remaining[key] = user_answer
+    return graded, remaining
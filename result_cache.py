@@ -0,0 +1,272 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """
+    Normalizes free text for use in cache keys by collapsing whitespace and
+    ignoring case.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    return " ".join(str(text).split()).casefold()
+
+
+def make_key(*parts):
+    """
+    Builds a stable cache key from the given parts.
+
+    Args:
+        *parts: JSON-serializable values identifying the cached result.
+
+    Returns:
+        str: The SHA-256 hex digest of the serialized parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache for JSON-serializable results.
+
+    The first tier is an in-process LRU bounded by entry count and by the size
+    of the serialized values, the second an optional SQLite file that survives
+    restarts and keeps at most max_disk_entries rows, dropping the oldest writes
+    first. Both tiers honour the same TTL; expired rows are purged on startup
+    and then at most every purge_interval seconds while values are written.
+    """
+
+    def __init__(
+        self,
+        max_entries=256,
+        ttl_seconds=3600,
+        path=None,
+        table="cache",
+        max_bytes=32 * 1024 * 1024,
+        max_disk_entries=100000,
+        purge_interval=600,
+    ):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept in memory.
+            ttl_seconds (float): Lifetime of an entry; 0 or None disables expiry.
+            path (str): SQLite file for the persistent tier, or None for memory only.
+            table (str): Table name used inside the SQLite file.
+            max_bytes (int): Maximum serialized size of the entries kept in memory.
+            max_disk_entries (int): Maximum number of rows kept in the SQLite file.
+            purge_interval (float): Minimum seconds between purges of expired rows.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+        self.path = path
+        self.table = table
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_entries = 0
+        self._last_purge = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self.saved_seconds = 0.0
+
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    cost_seconds REAL NOT NULL,
+                    expires_at REAL
+                )
+            """
+            )
+            self._disk_entries = self._conn.execute(
+                f"SELECT COUNT(*) FROM {table}"
+            ).fetchone()[0]
+            self._purge_expired(time.time())
+            self._trim_disk()
+            self._conn.commit()
+
+    def _expires_at(self):
+        if not self.ttl_seconds:
+            return None
+        return time.time() + self.ttl_seconds
+
+    def _remember(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[3]
+        self._entries[key] = entry
+        self._bytes += entry[3]
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            self._bytes -= self._entries.popitem(last=False)[1][3]
+
+    def _forget(self, key):
+        self._bytes -= self._entries.pop(key)[3]
+
+    def _purge_expired(self, now):
+        cursor = self._conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (now,),
+        )
+        self._last_purge = now
+        self._disk_entries -= cursor.rowcount
+
+    def _trim_disk(self):
+        # REPLACE gives a rewritten key a new rowid, so the lowest rowids are
+        # the oldest writes
+        excess = self._disk_entries - (self.max_disk_entries or self._disk_entries)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            f"""
+            DELETE FROM {self.table} WHERE rowid IN (
+                SELECT rowid FROM {self.table} ORDER BY rowid LIMIT ?
+            )
+        """,
+            (excess,),
+        )
+        self.disk_evictions += excess
+        self._disk_entries -= excess
+
+    def _existing_keys(self, keys):
+        existing = set()
+        keys = list(keys)
+        # Chunked to stay below SQLite's limit on bound parameters
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            existing.update(
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT key FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return existing
+
+    def _write(self, rows):
+        # Replaced keys keep the row count, so only new keys are counted and the
+        # count stays exact without a COUNT(*) per write
+        keys = {row[0] for row in rows}
+        added = len(keys - self._existing_keys(keys))
+        self._conn.executemany(
+            f"""
+            INSERT OR REPLACE INTO {self.table} (key, value, cost_seconds, expires_at)
+            VALUES (?, ?, ?, ?)
+        """,
+            rows,
+        )
+        self._disk_entries += added
+        now = time.time()
+        if now - self._last_purge >= self.purge_interval:
+            self._purge_expired(now)
+        self._trim_disk()
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Looks up a key in memory first and then on disk.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < now:
+                self._forget(key)
+                entry = None
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    f"SELECT value, cost_seconds, expires_at FROM {self.table} WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and (row[2] is None or row[2] >= now):
+                    entry = (json.loads(row[0]), row[1], row[2], len(row[0]))
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def set(self, key, value, cost_seconds=0.0):
+        """
+        Stores a value in both tiers.
+
+        Args:
+            key (str): The cache key.
+            value: A JSON-serializable value.
+            cost_seconds (float): How long producing the value took, used to
+                report the time saved by later hits.
+        """
+        serialized = json.dumps(value)
+        entry = (value, cost_seconds, self._expires_at(), len(serialized))
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                self._write([(key, serialized, cost_seconds, entry[2])])
+
+    def set_many(self, items, cost_seconds=0.0):
+        """
+        Stores several values in both tiers with a single disk commit.
+
+        Args:
+            items (iterable): (key, value) pairs.
+            cost_seconds (float): How long producing each value took.
+        """
+        expires_at = self._expires_at()
+        items = list(items)
+        rows = [
+            (key, json.dumps(value), cost_seconds, expires_at) for key, value in items
+        ]
+        with self._lock:
+            for (key, value), row in zip(items, rows):
+                self._remember(key, (value, cost_seconds, expires_at, len(row[1])))
+            if self._conn is not None:
+                self._write(rows)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit and miss counters, memory size and total seconds saved.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_entries": self._disk_entries,
+                "disk_evictions": self.disk_evictions,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
@@ -0,0 +1,214 @@
+import heapq
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# SM-2 defaults: new cards start at ease 2.5, which never drops below 1.3
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+
+def sm2(score, ease=INITIAL_EASE, interval_days=0.0, repetitions=0):
+    """
+    Applies one SM-2 review to a card.
+
+    Args:
+        score (float): Evaluation score from 0 to 10, mapped to SM-2 quality 0-5.
+        ease (float): The card's current ease factor.
+        interval_days (float): The card's current interval.
+        repetitions (int): Successful reviews in a row so far.
+
+    Returns:
+        tuple: The new (ease, interval_days, repetitions).
+    """
+    quality = max(0.0, min(5.0, float(score) / 2))
+    if quality < 3:
+        # A failed recall starts the card over, but keeps its ease
+        return ease, 1.0, 0
+    repetitions += 1
+    if repetitions == 1:
+        interval_days = 1.0
+    elif repetitions == 2:
+        interval_days = 6.0
+    else:
+        interval_days = round(interval_days * ease, 2)
+    ease += 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return max(MIN_EASE, ease), interval_days, repetitions
+
+
+class ReviewScheduler:
+    """
+    Spaced-repetition schedule of every user's cards.
+
+    The schedule is persisted in SQLite with an index on (user_id, due_at).
+    For users served recently, the due dates are also kept in an in-memory
+    min-heap, so picking the next cards costs O(log n) per card regardless of
+    how many cards the user has. Rescheduled cards are pushed again and their
+    old heap entries skipped when they surface.
+    """
+
+    def __init__(self, path="reviews.sql", max_users=10000):
+        """
+        Args:
+            path (str): The SQLite database file.
+            max_users (int): Users whose heaps are kept in memory.
+        """
+        self.path = path
+        self.max_users = max_users
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # user_id -> (heap of (due_at, deck_id, question), {(deck_id, question): due_at})
+        self._queues = OrderedDict()
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reviews (
+                user_id TEXT NOT NULL,
+                deck_id TEXT NOT NULL,
+                question INTEGER NOT NULL,
+                ease REAL NOT NULL,
+                interval_days REAL NOT NULL,
+                repetitions INTEGER NOT NULL,
+                last_score REAL NOT NULL,
+                reviewed_at REAL NOT NULL,
+                due_at REAL NOT NULL,
+                PRIMARY KEY (user_id, deck_id, question)
+            )
+        """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS reviews_user_due ON reviews (user_id, due_at)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _queue(self, user_id):
+        # Must be called with the lock held
+        queue = self._queues.get(user_id)
+        if queue is None:
+            rows = (
+                self._connection()
+                .execute(
+                    "SELECT due_at, deck_id, question FROM reviews WHERE user_id = ?",
+                    (user_id,),
+                )
+                .fetchall()
+            )
+            heap = [tuple(row) for row in rows]
+            heapq.heapify(heap)
+            queue = (heap, {(deck_id, question): due for due, deck_id, question in heap})
+            self._queues[user_id] = queue
+            while len(self._queues) > self.max_users:
+                self._queues.popitem(last=False)
+        self._queues.move_to_end(user_id)
+        return queue
+
+    def record(self, user_id, deck_id, scores, now=None):
+        """
+        Reschedules the cards a user was just evaluated on.
+
+        Args:
+            user_id (str): The user.
+            deck_id (str): The deck the cards belong to.
+            scores (dict): Scores from 0 to 10 keyed by 1-based question number.
+            now (float): Review time as a Unix timestamp; defaults to now.
+
+        Returns:
+            int: The number of cards rescheduled.
+        """
+        now = time.time() if now is None else now
+        scores = {int(question): float(score) for question, score in scores.items()}
+        if not scores:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            placeholders = ", ".join("?" * len(scores))
+            previous = {
+                row[0]: row[1:]
+                for row in conn.execute(
+                    "SELECT question, ease, interval_days, repetitions FROM reviews "
+                    f"WHERE user_id = ? AND deck_id = ? AND question IN ({placeholders})",
+                    (user_id, deck_id, *scores),
+                )
+            }
+            rows = []
+            for question, score in scores.items():
+                ease, interval_days, repetitions = sm2(score, *previous.get(question, ()))
+                due_at = now + interval_days * SECONDS_PER_DAY
+                rows.append(
+                    (
+                        user_id,
+                        deck_id,
+                        question,
+                        ease,
+                        interval_days,
+                        repetitions,
+                        score,
+                        now,
+                        due_at,
+                    )
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO reviews (user_id, deck_id, question, ease, "
+                "interval_days, repetitions, last_score, reviewed_at, due_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+            queue = self._queues.get(user_id)
+            if queue is not None:
+                heap, due = queue
+                for row in rows:
+                    due[(deck_id, row[2])] = row[8]
+                    heapq.heappush(heap, (row[8], deck_id, row[2]))
+        return len(rows)
+
+    def next_due(self, user_id, n=10, now=None):
+        """
+        Returns the user's cards that are due, most overdue first.
+
+        Args:
+            user_id (str): The user.
+            n (int): Maximum number of cards returned.
+            now (float): Unix timestamp to compare due dates with.
+
+        Returns:
+            list: Dicts with 'deck_id', 'question' and 'due_at'.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            heap, due = self._queue(user_id)
+            picked = []
+            while heap and len(picked) < n and heap[0][0] <= now:
+                entry = heapq.heappop(heap)
+                # Skip entries left behind by later reviews of the same card
+                if due.get(entry[1:]) == entry[0]:
+                    picked.append(entry)
+            # Cards stay due until they are reviewed
+            for entry in picked:
+                heapq.heappush(heap, entry)
+        return [
+            {"deck_id": deck_id, "question": question, "due_at": due_at}
+            for due_at, deck_id, question in picked
+        ]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Users and queue entries held in memory.
+        """
+        with self._lock:
+            return {
+                "cached_users": len(self._queues),
+                "queued_cards": sum(len(heap) for heap, _ in self._queues.values()),
+            }
@@ -0,0 +1,83 @@
+import asyncio
+
+from metrics import REGISTRY
+
+singleflight_calls = REGISTRY.counter(
+    "singleflight_calls",
+    "Calls through a single-flight group, by whether they ran or joined a running call.",
+    ["group", "result"],
+)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is running,
+    later calls for the same key wait for its result instead of starting
+    their own.
+
+    Calls are tracked per event loop without locking, so all methods must run
+    on the shared loop.
+    """
+
+    def __init__(self, group):
+        """
+        Args:
+            group (str): Name of the group, used as a metrics label.
+        """
+        self.group = group
+        self._calls = {}
+
+    def running(self, key):
+        """
+        Returns:
+            asyncio.Future: The call in flight for key, or None.
+        """
+        return self._calls.get(key)
+
+    def lead(self, key):
+        """
+        Registers a call for key that the caller produces itself, e.g. while
+        streaming it, so that do() and running() callers wait for its result.
+        The caller must resolve the returned future on every path.
+
+        Args:
+            key (str): Identifies equivalent calls.
+
+        Returns:
+            asyncio.Future: The future to resolve with the result.
+        """
+        singleflight_calls.inc(group=self.group, result="executed")
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    async def do(self, key, func):
+        """
+        Runs func() unless a call for key is already in flight, in which case
+        its result (or exception) is shared.
+
+        Args:
+            key (str): Identifies equivalent calls.
+            func (callable): Returns the coroutine to run.
+
+        Returns:
+            The result of the call.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            singleflight_calls.inc(group=self.group, result="coalesced")
+        else:
+            singleflight_calls.inc(group=self.group, result="executed")
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # A cancelled caller must not cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved when every caller has gone away
+            task.exception()
@@ -0,0 +1,73 @@
+"""
+Measures how long a fresh interpreter takes to build the app, and which of
+the heavy dependencies it imports on the way.
+
+Usage:
+    python startup_report.py [--runs 5] [--statement "import app; app.create_app()"]
+
+Every measurement runs in a new process, so nothing is served from an already
+populated sys.modules. The result is printed as JSON.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+DEFAULT_STATEMENT = "import app; app.create_app()"
+# Dependencies that the app factory should only import on first use
+HEAVY_MODULES = ["mistralai", "PyPDF2", "tonutils.wallet", "tonutils.client"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "loaded": [name for name in {modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(statement, modules=HEAVY_MODULES):
+    """
+    Runs statement in a new interpreter.
+
+    Returns:
+        dict: 'seconds' spent in the statement and the 'loaded' heavy modules.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(statement=statement, modules=modules)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_seconds(statement, runs):
+    return statistics.median(probe(statement)["seconds"] for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--statement", default=DEFAULT_STATEMENT)
+    args = parser.parse_args()
+
+    report = {
+        "statement": args.statement,
+        "runs": args.runs,
+        "median_seconds": median_seconds(args.statement, args.runs),
+        "heavy_modules_loaded": probe(args.statement)["loaded"],
+        "heavy_module_import_seconds": {
+            name: median_seconds(f"import {name}", args.runs) for name in HEAVY_MODULES
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+from json_repair import parse_fragment
+
+
+class FlashcardStreamParser:
+    """
+    Incremental parser for a streamed {"theory": ..., "flashcards": [...]} reply.
+
+    Text is fed in arbitrary pieces. The theory is reported as soon as its
+    string closes and each card as soon as its object closes, without waiting
+    for the rest of the document. Anything before the first '{' (prose or a
+    code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        # One entry per open container: [kind, current key, expecting a key]
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._card_start = None
+        self._finished = False
+
+    def _in_cards_array(self):
+        return (
+            len(self._stack) == 2
+            and self._stack[0][1] == "flashcards"
+            and self._stack[1][0] == "["
+        )
+
+    def feed(self, text):
+        """
+        Adds the next piece of model output.
+
+        Args:
+            text (str): The new text.
+
+        Returns:
+            list: Completed events, each ("theory", str) or ("card", dict).
+        """
+        self.buffer += text
+        events = []
+        while self._pos < len(self.buffer) and not self._finished:
+            char = self.buffer[self._pos]
+            if self._in_string:
+                self._on_string_char(char, events)
+            elif not self._stack:
+                if char == "{":
+                    self._stack.append(["{", None, True])
+            else:
+                self._on_structure_char(char, events)
+            self._pos += 1
+        return events
+
+    def _on_string_char(self, char, events):
+        if self._escaped:
+            self._escaped = False
+            return
+        if char == "\\":
+            self._escaped = True
+            return
+        if char != '"':
+            return
+        self._in_string = False
+        literal = self.buffer[self._string_start : self._pos + 1]
+        top = self._stack[-1]
+        if top[0] == "{" and top[2]:
+            top[1] = _decode_string(literal)
+            top[2] = False
+        elif len(self._stack) == 1 and top[1] == "theory":
+            events.append(("theory", _decode_string(literal)))
+
+    def _on_structure_char(self, char, events):
+        top = self._stack[-1]
+        if char == '"':
+            self._in_string = True
+            self._string_start = self._pos
+        elif char in "{[":
+            if char == "{" and self._in_cards_array():
+                self._card_start = self._pos
+            self._stack.append([char, None, char == "{"])
+        elif char in "}]":
+            self._stack.pop()
+            if char == "}" and self._in_cards_array() and self._card_start is not None:
+                card = _decode_card(self.buffer[self._card_start : self._pos + 1])
+                self._card_start = None
+                if card is not None:
+                    events.append(("card", card))
+            if not self._stack:
+                self._finished = True
+        elif char == "," and top[0] == "{":
+            top[2] = True
+
+
+def _decode_string(literal):
+    # The tolerant parser keeps LaTeX such as \( or \frac literal
+    try:
+        return parse_fragment(literal)
+    except ValueError:
+        return literal[1:-1]
+
+
+def _decode_card(source):
+    try:
+        card = parse_fragment(source)
+    except ValueError:
+        return None
+    if not isinstance(card, dict) or not card.get("front") or not card.get("back"):
+        return None
+    return {"front": str(card["front"]), "back": str(card["back"])}
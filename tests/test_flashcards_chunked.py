@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_data_dir = tempfile.mkdtemp()
+os.environ.setdefault("FLASHCARD_CACHE_PATH", "")
+os.environ.setdefault("DECK_STORE_PATH", os.path.join(_data_dir, "decks.sql"))
+os.environ.setdefault("REVIEW_STORE_PATH", os.path.join(_data_dir, "reviews.sql"))
+
+import flashcards  # noqa: E402
+
+
+def _document(sections):
+    return "\n\n".join(f"Section {idx}. " + "word " * 60 for idx in range(sections))
+
+
+def _generate(monkeypatch):
+    calls = []
+
+    async def fake_generate(chunk, number):
+        calls.append((chunk, number))
+        section = chunk.split(".", 1)[0]
+        return {
+            "theory": f"{section} theory. " * 200,
+            "flashcards": [
+                {"front": f"{section} question {idx}", "back": "answer"}
+                for idx in range(number)
+            ],
+        }
+
+    monkeypatch.setattr(flashcards, "CHUNK_TOKENS", 100)
+    monkeypatch.setattr(flashcards, "generate_flashcards_async", fake_generate)
+    return calls
+
+
+def test_few_cards_from_a_long_document_use_few_sections(monkeypatch):
+    calls = _generate(monkeypatch)
+    deck = asyncio.run(flashcards.generate_flashcards_chunked_async(_document(40), 3))
+
+    assert len(calls) == 1
+    assert len(deck["flashcards"]) == 3
+
+
+def test_sections_are_sampled_across_the_document(monkeypatch):
+    calls = _generate(monkeypatch)
+    deck = asyncio.run(flashcards.generate_flashcards_chunked_async(_document(40), 12))
+
+    sections = [chunk.split(".", 1)[0] for chunk, _ in calls]
+    assert sections == ["Section 5", "Section 15", "Section 25", "Section 35"]
+    assert len(deck["flashcards"]) == 12
+
+
+def test_merged_theory_is_bounded(monkeypatch):
+    _generate(monkeypatch)
+    monkeypatch.setattr(flashcards, "MAX_SECTIONS", 40)
+    deck = asyncio.run(flashcards.generate_flashcards_chunked_async(_document(40), 120))
+
+    assert len(deck["theory"]) <= flashcards.MAX_THEORY_CHARS
+    assert "Section 39 theory" in deck["theory"]
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_data_dir = tempfile.mkdtemp()
+os.environ.setdefault("FLASHCARD_CACHE_PATH", "")
+os.environ.setdefault("DECK_STORE_PATH", os.path.join(_data_dir, "decks.sql"))
+os.environ.setdefault("REVIEW_STORE_PATH", os.path.join(_data_dir, "reviews.sql"))
+
+import flashcards  # noqa: E402
+import llm_client  # noqa: E402
+
+DECK = {
+    "theory": "Photosynthesis turns light into chemical energy.",
+    "flashcards": [
+        {"front": "Where does photosynthesis happen?", "back": "Chloroplasts"},
+        {"front": "What gas is released?", "back": "Oxygen"},
+    ],
+}
+
+
+def test_identical_requests_share_one_streamed_generation(monkeypatch):
+    calls = []
+
+    async def fake_stream(prompt, model=None, kind="chat", **kwargs):
+        calls.append(prompt)
+        reply = json.dumps(DECK)
+        for start in range(0, len(reply), 16):
+            await asyncio.sleep(0.001)
+            yield reply[start : start + 16]
+
+    async def fail_complete(*args, **kwargs):
+        raise AssertionError("followers must not call the model")
+
+    monkeypatch.setattr(llm_client, "stream_async", fake_stream)
+    monkeypatch.setattr(llm_client, "complete_async", fail_complete)
+
+    async def stream():
+        return [event async for event in flashcards.stream_flashcards_async("plants", 2)]
+
+    async def main():
+        leader = asyncio.ensure_future(stream())
+        await asyncio.sleep(0.005)
+        return await asyncio.gather(
+            leader, stream(), flashcards.generate_flashcards_async("plants", 2)
+        )
+
+    leader_events, follower_events, deck = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert deck == DECK
+    for events in (leader_events, follower_events):
+        cards = [event["card"] for event in events if event["type"] == "card"]
+        assert cards == DECK["flashcards"]
+        assert events[-1]["type"] == "done"
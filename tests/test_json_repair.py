@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import parse_json  # noqa: E402
+
+
+def test_frac_stays_literal():
+    assert parse_json(r'{"back": "\frac{1}{2}"}') == {"back": "\\frac{1}{2}"}
+
+
+def test_theta_stays_literal():
+    assert parse_json(r'{"back": "\theta = \beta \times 2"}') == {
+        "back": "\\theta = \\beta \\times 2"
+    }
+
+
+def test_other_latex_commands_stay_literal():
+    text = r'{"back": "\left( x \right) \neq \nabla \sqrt{2}"}'
+    assert parse_json(text) == {"back": "\\left( x \\right) \\neq \\nabla \\sqrt{2}"}
+
+
+def test_json_escapes_are_kept():
+    text = r'{"back": "line\nThe end\t1 \"quoted\" \\frac é"}'
+    assert parse_json(text) == {"back": 'line\nThe end\t1 "quoted" \\frac é'}
+
+
+def test_smart_quotes_inside_strings_are_text():
+    text = r'{"theory": "Use \frac{a}{b} — called a “fraction”", "flashcards": []}'
+    assert parse_json(text) == {
+        "theory": "Use \\frac{a}{b} — called a “fraction”",
+        "flashcards": [],
+    }
+
+
+def test_smart_quotes_as_delimiters_are_replaced():
+    assert parse_json("{“theory”: “T”, “flashcards”: []}") == {
+        "theory": "T",
+        "flashcards": [],
+    }
+
+
+def test_python_literal_fallback_keeps_latex():
+    text = r"""{'front': 'it\'s \theta', 'back': 'x'}"""
+    assert parse_json(text) == {"front": "it's \\theta", "back": "x"}
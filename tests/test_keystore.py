@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keystore import KeyStore  # noqa: E402
+
+
+def test_master_key_is_required_outside_development(tmp_path, monkeypatch):
+    monkeypatch.delenv("KEYSTORE_MASTER_KEY", raising=False)
+    keystore = KeyStore(
+        str(tmp_path / "keystore.sql"), key_path=str(tmp_path / "keystore.key")
+    )
+    with pytest.raises(RuntimeError):
+        keystore.unlock()
+    assert not (tmp_path / "keystore.key").exists()
+
+
+def test_master_key_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("KEYSTORE_MASTER_KEY", "11" * 32)
+    keystore = KeyStore(str(tmp_path / "keystore.sql"))
+    keystore.unlock()
+    assert keystore.put("w", "22" * 32)
+    assert keystore.load("w")["private_key"] == "22" * 32
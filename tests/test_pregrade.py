@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pregrade import is_certainly_correct  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "user_answer, expected_answer",
+    [
+        ("paris.", "Paris"),
+        ("Mitochondria", "mitochondria"),
+        ("1/2", r"\frac{1}{2}"),
+        ("$x^{2}$", "x^2"),
+        ("1,000", "1000"),
+        ("3.0", "3"),
+        ("1E5", "100000"),
+        ("0", "0.0"),
+        ("f(x)", "f(x)"),
+    ],
+)
+def test_equivalent_answers_are_certain(user_answer, expected_answer):
+    assert is_certainly_correct(user_answer, expected_answer)
+
+
+@pytest.mark.parametrize(
+    "user_answer, expected_answer",
+    [
+        ("CO", "Co"),
+        ("2/4", "1/2"),
+        (r"\frac{2}{4}", r"\frac{1}{2}"),
+        ("0.5", "1/2"),
+        ("fx", "f(x)"),
+        ("0", "1e-13"),
+    ],
+)
+def test_different_answers_are_not_certain(user_answer, expected_answer):
+    assert not is_certainly_correct(user_answer, expected_answer)
+    assert not is_certainly_correct(expected_answer, user_answer)
@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_repository import UserRepository  # noqa: E402
+
+
+def test_blob_public_keys_are_found_after_create_schema(tmp_path):
+    path = str(tmp_path / "users.sql")
+    public_key = bytes(range(32))
+    conn = sqlite3.connect(path)
+    # The schema and row format written by the first version
+    conn.execute(
+        "CREATE TABLE users (wallet_id TEXT PRIMARY KEY, public_key TEXT NOT NULL, "
+        "private_key TEXT NOT NULL, balance REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO users VALUES (?, ?, ?, ?)", ("old", public_key, b"\x01" * 32, 0)
+    )
+    conn.commit()
+
+    users = UserRepository(path)
+    users.create_schema()
+
+    assert users.get_by_public_key(public_key.hex())["wallet_id"] == "old"
+    assert users.get_by_public_key(public_key.hex().upper())["wallet_id"] == "old"
+    assert users.get_by_public_key(public_key)["public_key"] == public_key.hex()
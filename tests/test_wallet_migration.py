@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wallet_management  # noqa: E402
+from keystore import KeyStore  # noqa: E402
+from user_repository import UserRepository  # noqa: E402
+
+
+def _baseline_wallet(tmp_path, public_key, private_key, mnemonic):
+    # The users row and wallets/<address>.txt exactly as the first version wrote them
+    conn = sqlite3.connect(str(tmp_path / "users.sql"))
+    conn.execute(
+        "CREATE TABLE users (wallet_id TEXT PRIMARY KEY, public_key TEXT NOT NULL, "
+        "private_key TEXT NOT NULL, balance REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO users VALUES (?, ?, ?, ?)", ("legacy", public_key, private_key, 0)
+    )
+    conn.commit()
+    wallets = tmp_path / "wallets"
+    wallets.mkdir()
+    (wallets / "EQlegacy.txt").write_text(
+        f"Address: EQlegacy\n"
+        f"Public Key: {public_key}\n"
+        f"Private Key: {private_key}\n"
+        f"Mnemonic: {mnemonic}\n"
+    )
+    return str(wallets)
+
+
+def test_baseline_wallet_file_is_imported_and_removed(tmp_path, monkeypatch):
+    public_key = bytes(range(32))
+    private_key = bytes(range(32, 96))
+    mnemonic = " ".join(["word"] * 24)
+    wallets_dir = _baseline_wallet(tmp_path, public_key, private_key, mnemonic)
+
+    users = UserRepository(str(tmp_path / "users.sql"))
+    keystore = KeyStore(
+        str(tmp_path / "keystore.sql"),
+        key_path=str(tmp_path / "keystore.key"),
+        allow_key_file=True,
+    )
+    monkeypatch.setattr(wallet_management, "users", users)
+    monkeypatch.setattr(wallet_management, "keystore", keystore)
+    users.create_schema()
+
+    assert wallet_management.migrate_private_keys(wallets_dir=wallets_dir) == 1
+
+    secrets = keystore.load("legacy")
+    assert secrets == {"private_key": private_key.hex(), "mnemonic": mnemonic}
+    assert os.listdir(wallets_dir) == []
+    assert users.wallets_with_private_key(10) == []
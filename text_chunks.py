@@ -0,0 +1,64 @@
+import re
+
+# Rough average for English prose with Mistral's tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens in a piece of text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The approximate token count.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_oversized(text, max_chars):
+    # Fall back to sentence boundaries, and to hard cuts for run-on text
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_text(text, max_tokens):
+    """
+    Splits text into sections of at most max_tokens estimated tokens, preferring
+    paragraph and then sentence boundaries.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): The token budget of a single section.
+
+    Returns:
+        list: The non-empty sections, in document order.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if len(paragraph) > max_chars:
+            pieces.extend(_split_oversized(paragraph, max_chars))
+        elif paragraph.strip():
+            pieces.append(paragraph)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
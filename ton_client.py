@@ -0,0 +1,138 @@
+import json
+import os
+import time
+
+import aiohttp
+from pytoniq_core import Address
+from tonutils.client import TonapiClient
+
+from metrics import tonapi_request_seconds
+
+# Maximum number of concurrent connections to Tonapi per process
+TONAPI_MAX_CONNECTIONS = int(os.environ.get("TONAPI_MAX_CONNECTIONS", 100))
+# Overrides the Tonapi host, e.g. to point at the stand-in server in bench/
+TONAPI_BASE_URL = os.environ.get("TONAPI_BASE_URL")
+
+_clients = {}
+
+
+def _path_label(path):
+    # Addresses and hashes are replaced so the metric keeps a bounded label set
+    path = path.split("?", 1)[0]
+    return "/".join(
+        "{id}" if ":" in part or len(part) >= 40 else part for part in path.split("/")
+    )
+
+
+class PooledTonapiClient(TonapiClient):
+    """
+    TonapiClient that keeps one aiohttp session, and therefore one connection
+    pool, for its whole lifetime instead of opening a session per request.
+
+    The session is bound to the event loop it is first used on, so all calls
+    must go through event_loop.run_sync() or run on that loop.
+    """
+
+    def __init__(self, api_key, is_testnet=False):
+        super().__init__(api_key=api_key, is_testnet=is_testnet)
+        if TONAPI_BASE_URL:
+            self.base_url = TONAPI_BASE_URL.rstrip("/") + "/"
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=TONAPI_MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _request(self, method, path, headers=None, params=None, body=None):
+        started = time.monotonic()
+        status = "error"
+        try:
+            content, status = await self._send_request(method, path, headers, params, body)
+            return content
+        except aiohttp.ClientResponseError as e:
+            status = e.status
+            raise
+        finally:
+            tonapi_request_seconds.observe(
+                time.monotonic() - started,
+                method=method,
+                path=_path_label(path),
+                status=status,
+            )
+
+    async def _send_request(self, method, path, headers, params, body):
+        session = self._get_session()
+        async with session.request(
+            method=method,
+            url=self.base_url + path,
+            headers=headers,
+            params=params,
+            json=body,
+        ) as response:
+            data = await response.read()
+            try:
+                content = json.loads(data.decode())
+            except json.JSONDecodeError:
+                content = data.decode()
+
+            if not response.ok:
+                raise aiohttp.ClientResponseError(
+                    request_info=response.request_info,
+                    history=response.history,
+                    status=response.status,
+                    message=str(
+                        content.get("error", content)
+                        if isinstance(content, dict)
+                        else content
+                    ),
+                )
+            return content, response.status
+
+    async def get_account_balances(self, addresses):
+        """
+        Reads the balances of many accounts in one request.
+
+        Args:
+            addresses (list): Account addresses in any format.
+
+        Returns:
+            dict: Maps each requested address to its balance in nanotons.
+                Addresses missing from the response are left out.
+        """
+        raw_addresses = {
+            Address(address).to_str(is_user_friendly=False): address
+            for address in addresses
+        }
+        content = await self._post(
+            method="v2/accounts/_bulk",
+            body={"account_ids": list(raw_addresses)},
+        )
+        balances = {}
+        for account in content.get("accounts", []):
+            address = raw_addresses.get(account.get("address"))
+            if address is not None:
+                balances[address] = int(account.get("balance", 0))
+        return balances
+
+
+def get_tonapi_client(api_key, is_testnet):
+    """
+    Returns the process-wide Tonapi client for the given credentials.
+
+    Args:
+        api_key (str): The Tonapi API key.
+        is_testnet (bool): Whether to use the test network.
+
+    Returns:
+        PooledTonapiClient: The shared client.
+    """
+    key = (api_key, is_testnet)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients.setdefault(key, PooledTonapiClient(api_key, is_testnet))
+    return client
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+
+
+class _Lane:
+    # Queue, worker and seqno state of one sender wallet
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.seqno = None
+        self.in_flight = None
+        self.submitted_at = 0.0
+
+
+class TransferSequencer:
+    """
+    Serializes the transfers of each sender wallet through its own queue and
+    worker on the shared event loop, while different wallets run in parallel.
+
+    The worker signs with a locally cached seqno instead of reading it before
+    every transfer. Transfers that queue up while a message is being submitted
+    are coalesced into the next message, up to max_messages per message. The
+    chain is only polled when the previous message was sent less than
+    settle_seconds ago, to learn when it landed; after a failure the seqno is
+    read again: the message is retried once if its seqno is still free, and
+    reported as sent if the chain has already moved past it.
+
+    All methods except stats() must run on the shared event loop.
+    """
+
+    def __init__(
+        self,
+        wallet_factory,
+        max_messages=255,
+        settle_seconds=15,
+        confirm_timeout=60,
+        poll_interval=1.0,
+        idle_timeout=300,
+    ):
+        """
+        Args:
+            wallet_factory (callable): Returns the wallet for a private key (bytes).
+            max_messages (int): Maximum transfers coalesced into one message.
+            settle_seconds (float): Age after which a submitted message is
+                assumed to have landed without polling the chain.
+            confirm_timeout (float): Seconds to wait for a message to land
+                before its seqno is considered free again.
+            poll_interval (float): Seconds between seqno polls.
+            idle_timeout (float): Seconds after which an idle wallet's worker exits.
+        """
+        self.wallet_factory = wallet_factory
+        self.max_messages = max_messages
+        self.settle_seconds = settle_seconds
+        self.confirm_timeout = confirm_timeout
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "transfers": 0,
+            "messages": 0,
+            "failed_messages": 0,
+            "retries": 0,
+            "applied_after_error": 0,
+            "seqno_reads": 0,
+        }
+
+    async def submit(self, private_key, transfer):
+        """
+        Queues a transfer behind the other transfers of the same wallet.
+
+        Args:
+            private_key (bytes): The sender's private key.
+            transfer (TransferData): The transfer to send.
+
+        Returns:
+            str: The hash of the external message carrying the transfer, or
+                None if the message was applied even though sending it
+                reported an error, so its hash is unknown.
+        """
+        wallet = self.wallet_factory(private_key)
+        address = wallet.address.to_str()
+        lane = self._lanes.get(address)
+        if lane is None:
+            lane = self._lanes[address] = _Lane(wallet)
+
+        future = asyncio.get_running_loop().create_future()
+        lane.queue.put_nowait((transfer, future))
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.ensure_future(self._work(address, lane))
+        return await future
+
+    def stats(self):
+        """
+        Returns:
+            dict: Active wallets and counters of transfers, messages, failures,
+                retries and seqno reads.
+        """
+        with self._lock:
+            return dict(self._stats, wallets=len(self._lanes))
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    async def _work(self, address, lane):
+        while True:
+            try:
+                first = await asyncio.wait_for(lane.queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if lane.queue.empty():
+                    self._lanes.pop(address, None)
+                    return
+                continue
+
+            batch = [first]
+            while len(batch) < self.max_messages and not lane.queue.empty():
+                batch.append(lane.queue.get_nowait())
+            batch = [(transfer, future) for transfer, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                message_hash = await self._send(lane, [transfer for transfer, _ in batch])
+            except Exception as e:
+                self._count("failed_messages")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._count("messages")
+            self._count("transfers", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(message_hash)
+
+    async def _read_seqno(self, lane):
+        self._count("seqno_reads")
+        try:
+            return await lane.wallet.get_seqno(lane.wallet.client, lane.wallet.address)
+        except KeyError:
+            # Uninitialized accounts are returned without code and data
+            return 0
+        except Exception as e:
+            # Unknown accounts are a 404; any other failure says nothing about
+            # the seqno and must not be mistaken for 0
+            if getattr(e, "status", None) == 404:
+                return 0
+            raise
+
+    async def _wait_applied(self, lane):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.confirm_timeout
+        while True:
+            seqno = await self._read_seqno(lane)
+            if seqno != lane.in_flight or loop.time() >= deadline:
+                # Either the message landed, or it was dropped and its seqno is free
+                return seqno
+            await asyncio.sleep(self.poll_interval)
+
+    async def _send(self, lane, transfers):
+        if lane.seqno is None:
+            lane.seqno = await self._read_seqno(lane)
+        elif (
+            lane.in_flight is not None
+            and time.monotonic() - lane.submitted_at < self.settle_seconds
+        ):
+            lane.seqno = await self._wait_applied(lane)
+
+        seqno = lane.seqno
+        try:
+            message_hash = await lane.wallet.batch_transfer(transfers, seqno=seqno)
+        except Exception as e:
+            lane.seqno = None
+            try:
+                chain_seqno = await self._read_seqno(lane)
+            except Exception:
+                raise e
+            if chain_seqno > seqno:
+                # The message was broadcast and applied although sending it
+                # failed, e.g. on a timeout; its hash is unknown
+                self._count("applied_after_error")
+                lane.in_flight = None
+                lane.seqno = chain_seqno
+                return None
+            # Only a seqno that is still free may be reused, so at most one of
+            # the two messages is ever applied
+            if chain_seqno != seqno:
+                raise
+            self._count("retries")
+            message_hash = await lane.wallet.batch_transfer(transfers, seqno=seqno)
+
+        lane.in_flight = seqno
+        lane.seqno = seqno + 1
+        lane.submitted_at = time.monotonic()
+        return message_hash
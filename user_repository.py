@@ -0,0 +1,365 @@
+import sqlite3
+import threading
+import time
+
+# Page cache per connection, in KiB (negative values are KiB for SQLite)
+CACHE_SIZE_KIB = 64 * 1024
+
+# Highload wallet query IDs are 23 bits wide
+QUERY_ID_MODULUS = 1 << 23
+
+# Columns added after the original schema, created on existing databases by
+# create_schema()
+_ADDED_COLUMNS = {
+    "address": "TEXT",
+    "balance_updated_at": "REAL",
+    "last_active_at": "REAL",
+    "wallet_version": "TEXT",
+}
+
+
+class UserRepository:
+    """
+    Repository for the 'users' table.
+
+    Each thread gets its own long-lived connection in WAL mode, so readers
+    never block the writer and no connection is opened per operation. Public
+    keys are stored as lowercase hex text; rows written as raw bytes by older
+    versions are converted by create_schema(). Private keys live in the
+    encrypted keystore; the private_key column is left empty for new rows and
+    cleared for old ones by the keystore migration.
+    """
+
+    def __init__(self, path="users.sql"):
+        """
+        Args:
+            path (str): The SQLite database file.
+        """
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        user = dict(row)
+        for field in ("public_key", "private_key"):
+            if isinstance(user.get(field), bytes):
+                user[field] = user[field].hex()
+        return user
+
+    @staticmethod
+    def _to_text(key):
+        return key.hex() if isinstance(key, bytes) else key.lower()
+
+    def create_schema(self):
+        """
+        Creates the users table and its lookup indexes if they do not exist, and
+        adds columns introduced since the table was first created.
+        """
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                wallet_id TEXT PRIMARY KEY,
+                public_key TEXT NOT NULL,
+                private_key TEXT NOT NULL,
+                balance REAL NOT NULL,
+                address TEXT,
+                balance_updated_at REAL,
+                last_active_at REAL,
+                wallet_version TEXT
+            )
+        """
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(users)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE users ADD COLUMN {column} {column_type}")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS query_ids (
+                address TEXT PRIMARY KEY,
+                last_query_id INTEGER NOT NULL
+            )
+        """
+        )
+        # Older versions stored keys as raw bytes; lookups compare hex text
+        conn.execute(
+            "UPDATE users SET public_key = lower(hex(public_key)) WHERE typeof(public_key) = 'blob'"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS users_public_key ON users (public_key)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS users_last_active_at ON users (last_active_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS users_balance_updated_at ON users (balance_updated_at)"
+        )
+        conn.commit()
+
+    def insert(self, wallet_id, public_key, balance=0, address=None, wallet_version=None):
+        """
+        Inserts a single user.
+
+        Raises:
+            sqlite3.IntegrityError: If the wallet_id already exists.
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO users (wallet_id, public_key, private_key, balance, address, last_active_at, wallet_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    wallet_id,
+                    self._to_text(public_key),
+                    "",
+                    balance,
+                    address,
+                    time.time(),
+                    wallet_version,
+                ),
+            )
+
+    def insert_many(self, users):
+        """
+        Inserts many users in one transaction, skipping existing wallet IDs.
+
+        Args:
+            users (list): (wallet_id, public_key, balance, address, wallet_version)
+                tuples.
+
+        Returns:
+            list: The wallet IDs that were inserted.
+        """
+        inserted = []
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            for wallet_id, public_key, balance, address, wallet_version in users:
+                cursor = conn.execute(
+                    """
+                    INSERT OR IGNORE INTO users (wallet_id, public_key, private_key, balance, address, last_active_at, wallet_version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (
+                        wallet_id,
+                        self._to_text(public_key),
+                        "",
+                        balance,
+                        address,
+                        now,
+                        wallet_version,
+                    ),
+                )
+                if cursor.rowcount:
+                    inserted.append(wallet_id)
+        return inserted
+
+    def existing_wallet_ids(self, wallet_ids):
+        """
+        Args:
+            wallet_ids (list): Wallet IDs to check.
+
+        Returns:
+            set: The subset of wallet_ids that already exist.
+        """
+        existing = set()
+        conn = self._connection()
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(wallet_ids), 500):
+            batch = wallet_ids[start : start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT wallet_id FROM users WHERE wallet_id IN ({placeholders})",
+                batch,
+            )
+            existing.update(row[0] for row in rows)
+        return existing
+
+    def get_by_wallet_id(self, wallet_id):
+        """
+        Returns:
+            dict: The user row, or None if the wallet ID is unknown.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT * FROM users WHERE wallet_id = ?", (wallet_id,))
+            .fetchone()
+        )
+        return self._to_dict(row)
+
+    def get_by_public_key(self, public_key):
+        """
+        Returns:
+            dict: The user row, or None if no wallet has this public key.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT * FROM users WHERE public_key = ?", (self._to_text(public_key),)
+            )
+            .fetchone()
+        )
+        return self._to_dict(row)
+
+    def touch(self, wallet_id):
+        """
+        Records activity on a wallet so the balance synchronizer refreshes it first.
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE users SET last_active_at = ? WHERE wallet_id = ?",
+                (time.time(), wallet_id),
+            )
+
+    def wallets_for_sync(self, limit, active_since):
+        """
+        Picks the wallets whose balances should be refreshed next: wallets active
+        since active_since first, then those with the oldest balances. Both
+        halves are read through an index.
+
+        Args:
+            limit (int): Maximum number of wallets returned.
+            active_since (float): Timestamp from which a wallet counts as active.
+
+        Returns:
+            list: (wallet_id, address) tuples.
+        """
+        conn = self._connection()
+        active = conn.execute(
+            """
+            SELECT wallet_id, address FROM users
+            WHERE last_active_at >= ? AND address IS NOT NULL
+            ORDER BY last_active_at DESC LIMIT ?
+        """,
+            (active_since, limit),
+        ).fetchall()
+        stale = conn.execute(
+            """
+            SELECT wallet_id, address FROM users
+            WHERE address IS NOT NULL
+            ORDER BY balance_updated_at ASC LIMIT ?
+        """,
+            (limit,),
+        ).fetchall()
+
+        wallets, seen = [], set()
+        for row in active + stale:
+            if row["wallet_id"] not in seen and len(wallets) < limit:
+                seen.add(row["wallet_id"])
+                wallets.append((row["wallet_id"], row["address"]))
+        return wallets
+
+    def wallets_without_address(self, limit):
+        """
+        Returns:
+            list: Up to limit user rows created before addresses were stored.
+        """
+        rows = (
+            self._connection()
+            .execute("SELECT * FROM users WHERE address IS NULL LIMIT ?", (limit,))
+            .fetchall()
+        )
+        return [self._to_dict(row) for row in rows]
+
+    def wallets_with_private_key(self, limit):
+        """
+        Returns:
+            list: Up to limit user rows that still hold a plaintext private key.
+        """
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT * FROM users WHERE private_key != '' LIMIT ?", (limit,)
+            )
+            .fetchall()
+        )
+        return [self._to_dict(row) for row in rows]
+
+    def clear_private_keys(self, wallet_ids):
+        """
+        Args:
+            wallet_ids (list): Wallets whose private keys were moved to the keystore.
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE users SET private_key = '' WHERE wallet_id = ?",
+                [(wallet_id,) for wallet_id in wallet_ids],
+            )
+
+    def reserve_query_ids(self, address, count):
+        """
+        Hands out the next query IDs of a highload wallet. The last ID is kept in
+        the database, so IDs are not reused after a restart or by another process
+        until the 23-bit space wraps around.
+
+        Args:
+            address (str): The highload wallet address.
+            count (int): Number of IDs needed.
+
+        Returns:
+            list: count query IDs in [0, 2**23).
+        """
+        seed = int(time.time()) % QUERY_ID_MODULUS
+        conn = self._connection()
+        # The first write takes the database lock, so the read below sees no
+        # concurrent reservation
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO query_ids (address, last_query_id) VALUES (?, ?)",
+                (address, seed),
+            )
+            conn.execute(
+                "UPDATE query_ids SET last_query_id = (last_query_id + ?) % ? WHERE address = ?",
+                (count, QUERY_ID_MODULUS, address),
+            )
+            last = conn.execute(
+                "SELECT last_query_id FROM query_ids WHERE address = ?", (address,)
+            ).fetchone()[0]
+        return [(last - count + 1 + idx) % QUERY_ID_MODULUS for idx in range(count)]
+
+    def set_addresses(self, addresses):
+        """
+        Args:
+            addresses (list): (wallet_id, address) tuples.
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE users SET address = ? WHERE wallet_id = ?",
+                [(address, wallet_id) for wallet_id, address in addresses],
+            )
+
+    def update_balances(self, balances, updated_at=None):
+        """
+        Writes many balances in one transaction.
+
+        Args:
+            balances (list): (wallet_id, balance) tuples.
+            updated_at (float): When the balances were read. Defaults to now.
+        """
+        updated_at = updated_at or time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE users SET balance = ?, balance_updated_at = ? WHERE wallet_id = ?",
+                [(balance, updated_at, wallet_id) for wallet_id, balance in balances],
+            )
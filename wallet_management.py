@@ -1,135 +1,609 @@
 import os
-import sqlite3
+import ast
 import asyncio
-from tonutils.client import TonapiClient
-from tonutils.wallet import KeyPair
-from tonutils.wallet import PreprocessedWalletV2R1
-from tonutils.wallet.data import TransferData
-from tonutils.client import TonapiClient
-from tonutils.wallet import (
-    WalletV3R1,
-    # Uncomment the following lines to use different wallet versions:
-    # WalletV3R2,
-    # WalletV4R1,
-    # WalletV4R2,
-    # WalletV5R1,
-    # HighloadWalletV2,
-    # HighloadWalletV3,
-    # PreprocessedWalletV2,
-    # PreprocessedWalletV2R1,
-)
+import multiprocessing
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from balance_sync import BalanceSynchronizer
+from event_loop import run_sync
+from keystore import KeyStore
+from metrics import REGISTRY, log
+from transfer_sequencer import TransferSequencer
+from user_repository import UserRepository
 
 # API key for accessing the Tonapi (obtainable from https://tonconsole.com)
-API_KEY = "AEXUUXDMF6AZYIIAAAAMJIJXGS7L4QVNYMFNVRXE7K2ZMH4ZEONFROWDBRMT6NK5IH5OTZY"  # Add your API key here.
+API_KEY = os.environ.get(
+    "TON_API_KEY",
+    "AEXUUXDMF6AZYIIAAAAMJIJXGS7L4QVNYMFNVRXE7K2ZMH4ZEONFROWDBRMT6NK5IH5OTZY",
+)  # Add your API key here.
 
 # Set to True for test network, False for main network
 IS_TESTNET = True
 
+users = UserRepository(os.environ.get("USERS_DB_PATH", "users.sql"))
+
+# Private keys and mnemonics, encrypted at rest and keyed by wallet_id.
+# Decrypted keys are cached for KEYSTORE_CACHE_TTL seconds.
+keystore = KeyStore(
+    os.environ.get("KEYSTORE_PATH", "keystore.sql"),
+    key_path=os.environ.get("KEYSTORE_KEY_PATH", "keystore.key"),
+    cache_ttl=float(os.environ.get("KEYSTORE_CACHE_TTL", 300)),
+    max_cached=int(os.environ.get("KEYSTORE_CACHED_KEYS", 10000)),
+    # Outside development the master key must come from KEYSTORE_MASTER_KEY
+    allow_key_file=os.environ.get("APP_ENV") == "development",
+)
+
+# Plaintext wallet files written by older versions, imported and removed by
+# migrate_private_keys()
+WALLETS_DIR = "wallets"
+
+# Processes used to derive keys from new mnemonics in create_wallets()
+KEYGEN_WORKERS = int(os.environ.get("KEYGEN_WORKERS", os.cpu_count() or 1))
+
+_keygen_executor = None
+
+# Transfers packed into one external message by send_batch(). The highload v3
+# contract accepts up to 254 * 254, but external messages are also capped in
+# cell count, which a few thousand transfers already approach.
+MAX_TRANSFERS_PER_MESSAGE = int(os.environ.get("MAX_TRANSFERS_PER_MESSAGE", 1000))
+
+# tonutils and pytoniq_core are imported inside the functions that use them,
+# so that loading this module (and starting the app) does not pay for them.
+
+
+def get_client():
+    """
+    Returns:
+        PooledTonapiClient: The shared Tonapi client for API_KEY and IS_TESTNET.
+    """
+    from ton_client import get_tonapi_client
+
+    return get_tonapi_client(API_KEY, IS_TESTNET)
+
 
-async def send(private_key: str, send_to: str, amount: float):
+# The same key controls a different address in every wallet contract, so each
+# wallet's version is stored with it and transfers are signed by that class.
+# Seqno wallets map to the transfers one external message can carry.
+WALLET_VERSIONS = {
+    "v3r1": ("WalletV3R1", 4),
+    "preprocessed_v2r1": ("PreprocessedWalletV2R1", 255),
+    "highload_v3": ("HighloadWalletV3", None),
+}
+# Version created by create_wallet() and create_wallets() unless another is
+# asked for; payout wallets are created as highload_v3 so that send_batch()
+# packs many transfers into each message
+WALLET_VERSION = "v3r1"
+# Versions assumed for a raw private_key, which carries no version of its own
+RAW_KEY_SEND_VERSION = "preprocessed_v2r1"
+RAW_KEY_BATCH_VERSION = "highload_v3"
+
+
+def wallet_class(version):
+    """
+    Returns:
+        type: The tonutils wallet class of a WALLET_VERSIONS key.
+    """
+    import tonutils.wallet
+
+    return getattr(tonutils.wallet, WALLET_VERSIONS[version][0])
+
+
+def _wallet_factory(version):
+    def factory(private_key):
+        return wallet_class(version).from_private_key(get_client(), private_key)
+
+    return factory
+
+
+# Serialize send() per sender wallet, one sequencer per seqno wallet version
+transfer_sequencers = {
+    version: TransferSequencer(
+        _wallet_factory(version),
+        max_messages=max_messages,
+        settle_seconds=float(os.environ.get("SEQNO_SETTLE_SECONDS", 15)),
+        confirm_timeout=float(os.environ.get("SEQNO_CONFIRM_TIMEOUT", 60)),
+    )
+    for version, (_, max_messages) in WALLET_VERSIONS.items()
+    if max_messages is not None
+}
+
+
+def transfer_sequencer_stats():
+    """
+    Returns:
+        dict: The counters of all transfer sequencers, summed.
+    """
+    totals = {}
+    for sequencer in transfer_sequencers.values():
+        for name, value in sequencer.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+# Background balance refresh; an interval of 0 disables it
+BALANCE_SYNC_INTERVAL = float(os.environ.get("BALANCE_SYNC_INTERVAL", 60))
+# The first cycle is held back so that it does not compete with a cold start
+BALANCE_SYNC_START_DELAY = float(os.environ.get("BALANCE_SYNC_START_DELAY", 10))
+balance_sync = BalanceSynchronizer(
+    users,
+    get_client,
+    interval=BALANCE_SYNC_INTERVAL,
+    batch_size=int(os.environ.get("BALANCE_SYNC_BATCH_SIZE", 100)),
+    max_wallets=int(os.environ.get("BALANCE_SYNC_MAX_WALLETS", 1000)),
+    active_window=float(os.environ.get("BALANCE_SYNC_ACTIVE_WINDOW", 3600)),
+)
+
+REGISTRY.register_stats("balance_sync", balance_sync.stats)
+REGISTRY.register_stats("transfer_sequencer", transfer_sequencer_stats)
+REGISTRY.register_stats("keystore", keystore.stats)
+
+# Reads of a balance record activity at most this often per wallet
+ACTIVITY_RESOLUTION_SECONDS = 60
+
+
+async def send(
+    private_key: str, send_to: str, amount: float, version: str = RAW_KEY_SEND_VERSION
+):
     """
     Sends the specified amount to the given address using the private key.
+    Transfers from the same wallet are queued and sequenced by the
+    transfer sequencer of its version, so concurrent calls never reuse a seqno.
 
     Args:
-        private_key (str): The private key of the sender's wallet.
+        private_key (str): The hex-encoded private key of the sender's wallet.
         send_to (str): The recipient's wallet address.
         amount (float): The amount to send (in TON).
+        version (str): The sender's wallet version from WALLET_VERSIONS.
 
     Returns:
-        None
+        str: The hash of the external message carrying the transfer, or None
+            if it was applied although sending it reported an error.
     """
-    client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
+    from pytoniq_core import Address
+    from tonutils.wallet.data import TransferData
 
-    # Create a KeyPair from the private key
-    keypair = KeyPair(private=private_key)
+    if version not in transfer_sequencers:
+        # Highload wallets have no seqno to sequence; send a batch of one
+        transfer = {
+            "destination": send_to,
+            "amount": amount,
+            "comment": "Transfer from tonutils",
+        }
+        result = (await send_batch(private_key, [transfer], version))[0]
+        if result["status"] != "submitted":
+            raise RuntimeError(result["error"])
+        return result["message_hash"]
 
-    # Create the wallet using the keypair
-    wallet = PreprocessedWalletV2R1(client=client, keypair=keypair)
+    if isinstance(private_key, str):
+        private_key = bytes.fromhex(private_key)
 
     # Perform the transfer
-    tx_hash = await wallet.transfer(
-        destination=send_to,
-        amount=amount,
-        body="Transfer from tonutils",
+    tx_hash = await transfer_sequencers[version].submit(
+        private_key,
+        TransferData(Address(send_to), amount, body="Transfer from tonutils"),
     )
 
-    print("Successfully transferred!")
-    print(f"Transaction hash: {tx_hash}")
+    log("Successfully transferred!")
+    log(f"Transaction hash: {tx_hash}")
+    return tx_hash
+
+
+def wallet_sender(wallet_id: str):
+    """
+    Returns:
+        tuple: (private_key, version) of the wallet, or None if the wallet ID
+            has no key in the keystore.
+    """
+    user = users.get_by_wallet_id(wallet_id)
+    private_key = keystore.private_key(wallet_id) if user is not None else None
+    if private_key is None:
+        return None
+    # Wallets created before versions were stored are all v3r1
+    return private_key, user.get("wallet_version") or "v3r1"
+
+
+def send_sync(
+    private_key: str, send_to: str, amount: float, version: str = RAW_KEY_SEND_VERSION
+):
+    """
+    Runs send() on the shared event loop, for synchronous callers such as
+    Flask request handlers.
+
+    Returns:
+        str: The hash of the transfer message.
+    """
+    return run_sync(send(private_key, send_to, amount, version))
+
+
+async def send_batch(
+    private_key: str, transfers: list, version: str = RAW_KEY_BATCH_VERSION
+):
+    """
+    Sends many transfers from the wallet of the given private key and version,
+    packing them into as few external messages as possible. A highload v3
+    wallet takes MAX_TRANSFERS_PER_MESSAGE transfers per message; seqno
+    wallets go through their transfer sequencer.
+
+    Args:
+        private_key (str): The hex-encoded private key of the sender's wallet.
+        transfers (list): Dicts with 'destination', 'amount' (in TON) and an
+            optional 'comment'.
+        version (str): The sender's wallet version from WALLET_VERSIONS.
+
+    Returns:
+        list: One dict per transfer, in request order, with 'status'
+            ('submitted', 'invalid' or 'failed') and either 'message_hash'
+            or 'error'.
+    """
+    from pytoniq_core import Address
+    from tonutils.wallet.data import TransferData
+
+    if isinstance(private_key, str):
+        private_key = bytes.fromhex(private_key)
+
+    results = [None] * len(transfers)
+    valid = []
+    for idx, transfer in enumerate(transfers):
+        try:
+            destination = Address(transfer["destination"])
+            amount = float(transfer["amount"])
+            if amount <= 0:
+                raise ValueError("amount must be positive")
+        except Exception as e:
+            results[idx] = {"index": idx, "status": "invalid", "error": str(e)}
+            continue
+        valid.append(
+            (idx, TransferData(destination, amount, body=transfer.get("comment")))
+        )
+
+    if version in transfer_sequencers:
+        sequencer = transfer_sequencers[version]
+        outcomes = await asyncio.gather(
+            *(sequencer.submit(private_key, data) for _, data in valid),
+            return_exceptions=True,
+        )
+        for (idx, _), outcome in zip(valid, outcomes):
+            if isinstance(outcome, Exception):
+                results[idx] = {"index": idx, "status": "failed", "error": str(outcome)}
+            else:
+                results[idx] = {"index": idx, "status": "submitted", "message_hash": outcome}
+        log(f"Submitted {len(valid)} transfers through the {version} sequencer.")
+        return results
+
+    wallet = wallet_class(version).from_private_key(get_client(), private_key)
+    groups = [
+        valid[start : start + MAX_TRANSFERS_PER_MESSAGE]
+        for start in range(0, len(valid), MAX_TRANSFERS_PER_MESSAGE)
+    ]
+    # Highload v3 rejects a reused query ID within its timeout, so IDs come from
+    # a per-wallet counter persisted in the users database
+    query_ids = users.reserve_query_ids(wallet.address.to_str(), len(groups))
+    outcomes = await asyncio.gather(
+        *(
+            wallet.batch_transfer([data for _, data in group], query_id=query_id)
+            for group, query_id in zip(groups, query_ids)
+        ),
+        return_exceptions=True,
+    )
+
+    for group, outcome in zip(groups, outcomes):
+        for idx, _ in group:
+            if isinstance(outcome, Exception):
+                results[idx] = {"index": idx, "status": "failed", "error": str(outcome)}
+            else:
+                results[idx] = {"index": idx, "status": "submitted", "message_hash": outcome}
+
+    log(f"Submitted {len(valid)} transfers in {len(groups)} messages.")
+    return results
+
+
+def send_batch_sync(
+    private_key: str, transfers: list, version: str = RAW_KEY_BATCH_VERSION
+):
+    """
+    Runs send_batch() on the shared event loop.
+
+    Returns:
+        list: The per-transfer results of send_batch().
+    """
+    return run_sync(send_batch(private_key, transfers, version))
 
 
 def create_db():
     """
     Creates a SQLite database 'users.sql' with a table 'users' and columns:
-    wallet_id, public_key, private_key, balance.
+    wallet_id, public_key, private_key, balance, address, balance_updated_at,
+    last_active_at and wallet_version, plus indexes on public_key and the sync
+    columns, and the query_ids table of highload wallet query IDs. Private keys
+    still stored in the table are moved to the keystore.
 
     Returns:
         None
+
+    Raises:
+        RuntimeError: If the keystore master key is not configured.
     """
-    conn = sqlite3.connect("users.sql")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            wallet_id TEXT PRIMARY KEY,
-            public_key TEXT NOT NULL,
-            private_key TEXT NOT NULL,
-            balance REAL NOT NULL
+    keystore.unlock()
+    users.create_schema()
+    log("Database 'users.sql' created with table 'users'.")
+    migrated = migrate_private_keys()
+    if migrated:
+        log(f"Moved the private keys of {migrated} wallets to the keystore.")
+
+
+def _key_hex(value):
+    # The first version wrote keys as Python bytes reprs (b'\x..'), later ones as hex
+    if value[:2] in ("b'", 'b"'):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+        return value.hex() if isinstance(value, bytes) else None
+    return value.lower()
+
+
+def _read_wallet_files(directory):
+    # Parses the plaintext files older versions wrote, keyed by hex public key
+    files = {}
+    if not os.path.isdir(directory):
+        return files
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        fields = {}
+        with open(path) as file:
+            for line in file:
+                key, _, value = line.partition(": ")
+                fields[key] = value.strip()
+        public_key = _key_hex(fields.get("Public Key", ""))
+        private_key = _key_hex(fields.get("Private Key", ""))
+        if public_key and private_key:
+            files[public_key] = (path, private_key, fields.get("Mnemonic") or None)
+    return files
+
+
+def migrate_private_keys(batch_size=500, wallets_dir=WALLETS_DIR):
+    """
+    Moves plaintext secrets into the keystore: private keys from the users
+    table, and mnemonics from the wallets/<address>.txt files older versions
+    wrote, which are deleted once their content is sealed. Keys are written
+    to the keystore before their plaintext is removed, so an interrupted
+    migration is simply resumed on the next start.
+
+    Returns:
+        int: The number of keys moved.
+    """
+    files = _read_wallet_files(wallets_dir)
+    moved = 0
+    while True:
+        rows = users.wallets_with_private_key(batch_size)
+        if not rows:
+            break
+        keystore.put_many(
+            [
+                (
+                    row["wallet_id"],
+                    row["private_key"],
+                    files.get(row["public_key"], (None, None, None))[2],
+                )
+                for row in rows
+            ]
         )
+        users.clear_private_keys([row["wallet_id"] for row in rows])
+        moved += len(rows)
+
+    unmatched = 0
+    for public_key, (path, private_key, mnemonic) in files.items():
+        user = users.get_by_public_key(public_key)
+        secrets = keystore.load(user["wallet_id"]) if user is not None else None
+        if secrets is None or secrets["private_key"] != private_key:
+            # Not a known wallet: keep the file rather than lose the key
+            unmatched += 1
+            continue
+        if secrets["mnemonic"] is None and mnemonic:
+            keystore.add_mnemonic(user["wallet_id"], mnemonic)
+        os.remove(path)
+    if unmatched:
+        log(f"Kept {unmatched} wallet files in {wallets_dir} matching no stored wallet.")
+    return moved
+
+
+def backfill_addresses(batch_size=500):
     """
-    )
-    conn.commit()
-    conn.close()
-    print("Database 'users.sql' created with table 'users'.")
+    Derives and stores the address of wallets created before addresses were
+    kept in the users table, so the balance synchronizer can refresh them.
+
+    Returns:
+        int: The number of addresses written.
+    """
+    written = 0
+    while True:
+        rows = users.wallets_without_address(batch_size)
+        if not rows:
+            return written
+        from tonutils.wallet import WalletV3R1
+
+        # These wallets predate stored versions and were all created as v3r1.
+        # The address only depends on the public key, so no secret is needed.
+        users.set_addresses(
+            [
+                (
+                    row["wallet_id"],
+                    WalletV3R1(
+                        None, bytes.fromhex(row["public_key"]), None
+                    ).address.to_str(),
+                )
+                for row in rows
+            ]
+        )
+        written += len(rows)
+
 
+def start_balance_sync():
+    """
+    Starts the background balance synchronizer unless BALANCE_SYNC_INTERVAL is 0.
+    """
+    if BALANCE_SYNC_INTERVAL <= 0:
+        return
+    backfilled = backfill_addresses()
+    if backfilled:
+        log(f"Stored addresses for {backfilled} existing wallets.")
+    balance_sync.start(delay=BALANCE_SYNC_START_DELAY)
 
-def create_wallet(wallet_id: str):
+
+def get_balance(wallet_id: str):
     """
-    Generates a mnemonic, creates a wallet using it, saves the keys and mnemonic
-    to the 'wallets' folder, and writes wallet details to the database.
+    Returns the last synchronized balance of a wallet without querying the
+    chain, and marks the wallet as active so it is refreshed first.
 
     Args:
         wallet_id (str): The unique wallet ID.
 
     Returns:
-        None
+        dict: 'wallet_id', 'address', 'balance' (in TON), 'updated_at' and
+            'stale_seconds' (both None if never synchronized) and 'stale',
+            or None if the wallet ID is unknown.
     """
-    client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
+    user = users.get_by_wallet_id(wallet_id)
+    if user is None:
+        return None
 
-    # Generate a new mnemonic and create the wallet
-    wallet_class = WalletV3R1
-    wallet, public_key, private_key, mnemonic = wallet_class.create(client)
+    now = time.time()
+    last_active_at = user.get("last_active_at")
+    if last_active_at is None or now - last_active_at > ACTIVITY_RESOLUTION_SECONDS:
+        users.touch(wallet_id)
 
-    mnemonic_str = " ".join(mnemonic)
+    updated_at = user.get("balance_updated_at")
+    stale_seconds = now - updated_at if updated_at is not None else None
+    return {
+        "wallet_id": wallet_id,
+        "address": user.get("address"),
+        "balance": user["balance"],
+        "updated_at": updated_at,
+        "stale_seconds": stale_seconds,
+        "stale": stale_seconds is None or stale_seconds > 2 * BALANCE_SYNC_INTERVAL,
+    }
+
+
+def _generate_wallet_keys(version):
+    # Runs in a worker process; the wallet object only serves to derive the address
+    wallet, public_key, private_key, mnemonic = wallet_class(version).create(None)
+    return wallet.address.to_str(), public_key.hex(), private_key.hex(), " ".join(mnemonic)
 
-    # Save wallet information to a file
-    os.makedirs("wallets", exist_ok=True)
-    wallet_file = os.path.join("wallets", f"{wallet.address.to_str()}.txt")
-    with open(wallet_file, "w") as file:
-        file.write(f"Address: {wallet.address.to_str()}\n")
-        file.write(f"Public Key: {public_key}\n")
-        file.write(f"Private Key: {private_key}\n")
-        file.write(f"Mnemonic: {mnemonic_str}\n")
 
-    print(f"Wallet saved to {wallet_file}")
+def create_wallets(wallet_ids: list, version: str = WALLET_VERSION):
+    """
+    Creates wallets for many IDs at once. Mnemonics and keys are generated in
+    parallel on a process pool and all rows are written in one transaction.
+
+    Args:
+        wallet_ids (list): The unique wallet IDs to create.
+        version (str): The wallet version from WALLET_VERSIONS to create.
+
+    Returns:
+        dict: Maps every requested wallet ID to 'created', 'conflict' (the ID
+            already exists) or 'duplicate' (the ID was repeated in the request).
+    """
+    global _keygen_executor
 
-    # Insert wallet details into the database
-    conn = sqlite3.connect("users.sql")
-    cursor = conn.cursor()
+    results = {}
+    new_ids = []
+    for wallet_id in wallet_ids:
+        if wallet_id in results:
+            results[wallet_id] = "duplicate"
+        else:
+            results[wallet_id] = None
+            new_ids.append(wallet_id)
 
+    existing = users.existing_wallet_ids(new_ids)
+    new_ids = [wallet_id for wallet_id in new_ids if wallet_id not in existing]
+    for wallet_id in existing:
+        results[wallet_id] = "conflict"
+    if not new_ids:
+        return results
+
+    if _keygen_executor is None:
+        # Forked workers would inherit the app's threads and SQLite connections
+        _keygen_executor = ProcessPoolExecutor(
+            max_workers=KEYGEN_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    chunksize = max(1, len(new_ids) // (KEYGEN_WORKERS * 4))
+    keys = list(
+        _keygen_executor.map(
+            _generate_wallet_keys, [version] * len(new_ids), chunksize=chunksize
+        )
+    )
+
+    # Keys are stored first, so no wallet row ever exists without its key.
+    # IDs taken by a concurrent request since the check above are skipped.
+    stored = set(
+        keystore.put_many(
+            [
+                (wallet_id, private_key, mnemonic)
+                for wallet_id, (_, _, private_key, mnemonic) in zip(new_ids, keys)
+            ]
+        )
+    )
     try:
-        cursor.execute(
-            """
-            INSERT INTO users (wallet_id, public_key, private_key, balance)
-            VALUES (?, ?, ?, ?)
-        """,
-            (wallet_id, public_key, private_key, 0),
+        inserted = set(
+            users.insert_many(
+                [
+                    (wallet_id, public_key, 0, address, version)
+                    for wallet_id, (address, public_key, _, _) in zip(new_ids, keys)
+                    if wallet_id in stored
+                ]
+            )
         )
-        conn.commit()
-        print(f"Wallet details inserted into database with wallet_id: {wallet_id}")
+    except Exception:
+        keystore.delete_many(list(stored))
+        raise
+    if stored - inserted:
+        keystore.delete_many(list(stored - inserted))
+    for wallet_id in new_ids:
+        results[wallet_id] = "created" if wallet_id in inserted else "conflict"
+
+    log(f"Created {len(inserted)} of {len(wallet_ids)} requested wallets.")
+    return results
+
+
+def create_wallet(wallet_id: str, version: str = WALLET_VERSION):
+    """
+    Generates a mnemonic, creates a wallet using it, writes wallet details to
+    the database and stores the private key and mnemonic in the keystore.
+
+    Args:
+        wallet_id (str): The unique wallet ID.
+        version (str): The wallet version from WALLET_VERSIONS to create.
+
+    Returns:
+        None
+    """
+    client = get_client()
+
+    # Generate a new mnemonic and create the wallet; its version is stored so
+    # that transfers are signed by the same contract
+    wallet, public_key, private_key, mnemonic = wallet_class(version).create(client)
+
+    mnemonic_str = " ".join(mnemonic)
+    address = wallet.address.to_str()
+
+    # Store the secrets first, so no wallet row ever exists without its key;
+    # an existing key is never replaced
+    if not keystore.put(wallet_id, private_key, mnemonic_str):
+        log(f"A key is already stored for wallet_id: {wallet_id}")
+        return
+    log(f"Wallet keys stored in the keystore for wallet_id: {wallet_id}")
+
+    # Insert wallet details into the database, withdrawing the key if that fails
+    try:
+        users.insert(wallet_id, public_key, 0, address, version)
+        log(f"Wallet details inserted into database with wallet_id: {wallet_id}")
     except sqlite3.IntegrityError as e:
-        print(f"An error occurred while inserting into the database: {e}")
-    finally:
-        conn.close()
+        keystore.delete_many([wallet_id])
+        log(f"An error occurred while inserting into the database: {e}")
+    except Exception:
+        keystore.delete_many([wallet_id])
+        raise
 
 
 def main():
@@ -145,7 +619,7 @@ def main():
         create_wallet(wallet_id)
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        log(f"An error occurred: {e}")
 
 
 if __name__ == "__main__":